@@ -0,0 +1,651 @@
+#! /usr/bin/env python
+
+# File: array_tree.py
+# Author: Dylan Schwilk
+# Copyright 2010 Dylan W. Schwilk
+
+# GNU
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+"""Compact, array-backed representation of rooted trees.
+
+   A PhyloTree node is a full python object, which is convenient for
+   manipulating trees but expensive for very large trees (megatrees with tens
+   of thousands of tips).  An ArrayTree stores the same information in a few
+   flat numpy arrays and a table of unique labels.  It is meant for read-only
+   analyses; convert back to a PhyloTree to modify the tree.
+
+   A ReplicateTrees object holds many trees that share one topology and
+   differ only in branch lengths (eg replicate bladj trees with random node
+   ages). The topology is stored once and the branch lengths as a matrix.
+
+   Functions:
+
+     from_phylotree(tree) - returns an ArrayTree copy of a PhyloTree
+     from_newick(src) - reads an ArrayTree directly from a newick string
+     read_trees(src) - reads ArrayTrees separated by semi-colons
+     save(trees, filename) - writes ArrayTrees to a binary tree file
+     load(filename) - reads ArrayTrees from a binary tree file
+     load_replicates(filename) - reads ReplicateTrees from a binary tree file
+
+   Binary tree files hold the arrays of one or more ArrayTrees exactly as
+   they are laid out in memory, so loading a large tree is a memory map
+   rather than a parse.  Each tree is one record: a fixed size header
+   (MAGIC, format version, node count, label count, label bytes and record
+   size), then the parent, first_child, bl and label_ids arrays, then the
+   label table as an array of offsets into a block of label bytes.  All
+   numbers are little-endian and every section starts on an 8 byte
+   boundary.  A ReplicateTrees record is flagged in its header and is the
+   topology record followed by the branch length matrix (one row per
+   replicate) as a standard NumPy .npy array.
+"""
+
+__version__ = "1.0"
+__author__  = '''Dylan Schwilk'''
+
+import os
+import re
+import struct
+
+import numpy
+
+from phylotree import PhyloTree
+
+NO_LABEL = -1  # label id for unlabeled nodes
+
+# Binary tree file records
+MAGIC = "DWSTREE\0"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIqqqq")   # magic, version, flags, nodes,
+_HEADER_SIZE = 64                      # labels, label bytes, record size
+REPLICATES = 1  # header flag: record is followed by a .npy bl matrix
+
+# Character classes for from_newick
+_WORD, _LPAREN, _RPAREN, _COMMA, _COLON, _SEMI, _SPACE, _LBRACKET, _RBRACKET = range(9)
+_char_kind = numpy.zeros(256, numpy.int8)
+for _c, _k in zip("(),:;[]", (_LPAREN, _RPAREN, _COMMA, _COLON, _SEMI, _LBRACKET, _RBRACKET)):
+    _char_kind[ord(_c)] = _k
+for _c in " \t\r\n":
+    _char_kind[ord(_c)] = _SPACE
+_QUOTE, _BLANK = ord("'"), ord(" ")
+_label_re = re.compile("[^\0]+")
+_nonascii_re = re.compile("[\x80-\xff]")
+_quoted_or_comment_re = re.compile(r"'(?:[^']|'')*'|\[[^\]]*\]")  # as newick
+
+
+class ArrayTree(object):
+    """Array-backed rooted tree.
+
+       Nodes are numbered in level order (breadth first, children in their
+       original order), so the root is node 0, every parent index is smaller
+       than the indices of its children and the children of node i are the
+       contiguous range first_child[i]:first_child[i+1].  Data members:
+          - parent: int32 array of parent indices, -1 for the root
+          - first_child: int32 array of child offsets (length n+1)
+          - bl: float64 array of branch lengths
+          - label_ids: int32 array of indices into labels, -1 if no label
+          - labels: list of unique label strings
+    """
+
+    def __init__(self, parent, first_child, bl, label_ids, labels):
+        self.parent = parent
+        self.first_child = first_child
+        self.bl = bl
+        self.label_ids = label_ids
+        self.labels = labels
+        self._levels = None
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __repr__(self):
+        return self.to_phylotree().write(True)
+
+    def nbytes(self):
+        """Approximate memory used by the arrays and the label table"""
+        n = self.parent.nbytes + self.first_child.nbytes + self.bl.nbytes \
+            + self.label_ids.nbytes
+        return n + sum([len(l) for l in self.labels])
+
+    def label(self, i):
+        """Returns label of node i or None"""
+        lid = self.label_ids[i]
+        if lid == NO_LABEL:
+            return None
+        return self.labels[lid]
+
+    def children(self, i):
+        """Returns array of child indices of node i"""
+        return numpy.arange(self.first_child[i], self.first_child[i+1])
+
+    def is_tip(self):
+        """Returns boolean array, True for leaf nodes"""
+        return self.first_child[1:] == self.first_child[:-1]
+
+    def tip_labels(self):
+        """Returns list of leaf labels in level order"""
+        return [self.label(i) for i in numpy.flatnonzero(self.is_tip())]
+
+    def levels(self):
+        """Returns list of offsets delimiting the levels of the tree. Nodes
+        at depth d are the range levels[d]:levels[d+1]."""
+        if self._levels is None:
+            n = len(self)
+            levels = [0, 1]
+            while levels[-1] < n:
+                levels.append(int(self.first_child[levels[-1]]))
+            self._levels = levels
+        return self._levels
+
+    def sum_bl(self, include_root=False):
+        """Sum branch lengths in tree"""
+        if include_root:
+            return self.bl.sum()
+        return self.bl[1:].sum()
+
+    def pd(self, l):
+        """calculate phylogenetic distance (total bl) for a set of taxa in
+        l. Same result as PhyloTree.pd(), computed level by level."""
+        ids = [i for i, lab in enumerate(self.labels) if lab in l]
+        marked = numpy.zeros(len(self), bool)
+        if ids:
+            marked = numpy.in1d(self.label_ids, ids)
+        levels = self.levels()
+        for d in range(len(levels)-2, 0, -1):
+            start, stop = levels[d], levels[d+1]
+            lvl = marked[start:stop]
+            marked[self.parent[start:stop][lvl]] = True
+        return self.bl[1:][marked[1:]].sum()
+
+    def to_phylotree(self, node_class=PhyloTree):
+        """Returns an equivalent tree of node_class nodes."""
+        labels = self.labels + [None]  # NO_LABEL indexes the None
+        nodes = [None] * len(self)
+        parent = self.parent.tolist()
+        for i, lid, bl in zip(xrange(len(self)), self.label_ids.tolist(),
+                              self.bl.tolist()):
+            p = parent[i]
+            if p < 0:
+                node = node_class(None, bl, labels[lid])
+            else:
+                p = nodes[p]
+                node = node_class(p, bl, labels[lid])
+                p.children.append(node)
+            nodes[i] = node
+        return nodes[0]
+
+
+class ReplicateTrees(object):
+    """Trees sharing one topology and differing only in branch lengths.
+
+       Data members:
+          - topology: ArrayTree, its bl array is replicate 0
+          - bl: list of float64 branch length arrays in the node order of
+            topology, one per replicate (a matrix with one row per
+            replicate when loaded from a file)
+
+       Replicate k is available as an ArrayTree (tree(k), sharing the
+       topology arrays) or as a new PhyloTree (to_phylotree(k)).
+    """
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.bl = [topology.bl]
+
+    def __len__(self):
+        return len(self.bl)
+
+    def add(self, tree):
+        """Record the branch lengths of tree (a PhyloTree) as a new
+        replicate. tree must have the same topology, in the same child
+        order, as the first replicate."""
+        nodes, parent = _level_order(tree)
+        if len(nodes) != len(self.topology):
+            raise ValueError("Replicate tree has %d nodes, expected %d" \
+                             % (len(nodes), len(self.topology)))
+        if not numpy.array_equal(parent, self.topology.parent):
+            raise ValueError("Replicate tree has a different topology")
+        if not isinstance(self.bl, list):
+            self.bl = list(self.bl)
+        self.bl.append(numpy.array([node.bl for node in nodes], numpy.float64))
+
+    def bl_matrix(self):
+        """Returns 2D array of branch lengths, one row per replicate"""
+        if isinstance(self.bl, numpy.ndarray):
+            return self.bl
+        return numpy.vstack(self.bl)
+
+    def tree(self, k):
+        """Returns replicate k as an ArrayTree sharing the topology arrays"""
+        t = self.topology
+        return ArrayTree(t.parent, t.first_child, self.bl[k], t.label_ids,
+                         t.labels)
+
+    def to_phylotree(self, k, node_class=PhyloTree):
+        """Returns replicate k as a tree of node_class nodes"""
+        return self.tree(k).to_phylotree(node_class)
+
+    def trees(self, node_class=PhyloTree):
+        """Generator of all replicates as trees of node_class nodes"""
+        for k in xrange(len(self)):
+            yield self.to_phylotree(k, node_class)
+
+    def arrays(self):
+        """Generator of all replicates as ArrayTrees"""
+        for k in xrange(len(self)):
+            yield self.tree(k)
+
+
+def from_phylotree(tree, namespace=None):
+    """Returns an ArrayTree copy of tree (any node with the PhyloTree
+    interface). If namespace (a phylotree.TaxonNamespace) is given the
+    label ids are the namespace ids and the labels list is shared with the
+    namespace, so the label ids of all trees converted with one namespace
+    are comparable. The namespace list only grows, so the ids stay valid as
+    more labels are interned; save writes only the labels a tree uses."""
+    nodes, parent = _level_order(tree)
+    if namespace is not None:
+        label_ids = numpy.array([_taxon_id(namespace, node.label)
+                                 for node in nodes], numpy.int32)
+        labels = namespace.labels
+    else :
+        label_ids, labels = _intern_labels([node.label for node in nodes])
+    parent = numpy.array(parent, numpy.int32)
+    bl = numpy.array([node.bl for node in nodes], numpy.float64)
+    return ArrayTree(parent, _child_offsets(parent), bl, label_ids, labels)
+
+
+def from_newick(src):
+    """Returns ArrayTree read from newick string src without creating tree
+    nodes. Accepts the same descriptions as newick.create_tree.
+
+    The work is done with numpy on the characters of src: each '(' or ','
+    creates a node at the current parenthesis depth, and sorting nodes by
+    (depth, position) gives level order. The node owning a word (a label or
+    branch length) is the last node created before it at the same depth,
+    and a node's parent is the last node created before it one level up, so
+    both are found with searchsorted on the sorted keys. Only the labels
+    become python strings; branch lengths are parsed by numpy."""
+    chars = numpy.frombuffer(src, numpy.uint8)
+    kind = _char_kind[chars]
+    if "'" in src or "[" in src:
+        # quoted labels are word characters and comments whitespace, found
+        # in one pass so a quote in a comment or a bracket in a label is
+        # plain text
+        quoted = numpy.zeros(len(chars) + 1, numpy.int32)
+        comment = numpy.zeros(len(chars) + 1, numpy.int32)
+        for m in _quoted_or_comment_re.finditer(src):
+            if src[m.start()] == "'":
+                mask = quoted
+            else :
+                mask = comment
+            mask[m.start()] += 1
+            mask[m.end()] -= 1
+        quoted = numpy.cumsum(quoted[:-1]) > 0
+        comment = numpy.cumsum(comment[:-1]) > 0
+        plain = ~(quoted | comment)
+        if (plain & (chars == _QUOTE)).any():
+            raise StandardError('Unterminated quote in tree description', src)
+        if (plain & (kind == _LBRACKET)).any():
+            raise StandardError('Unterminated comment in tree description', src)
+        kind[quoted] = _WORD
+        kind[comment] = _SPACE
+    semi = numpy.flatnonzero(kind == _SEMI)
+    if len(semi):   # stop at first semicolon
+        kind = kind[:semi[0]]
+    n = len(kind)
+
+    # structure characters and parenthesis depth after each
+    punct = numpy.flatnonzero((kind >= _LPAREN) & (kind <= _COLON))
+    pkind = kind[punct]
+    depth = numpy.cumsum(pkind == _LPAREN) - numpy.cumsum(pkind == _RPAREN)
+    if len(depth) and (depth.min() < 0 or depth[-1] != 0):
+        raise StandardError('Unbalanced parentheses in tree description', src)
+    if (kind > _SPACE).any():
+        raise StandardError('Unexpected character in tree description', src)
+
+    # nodes, root first, keyed by (depth, position + 1)
+    created = (pkind == _LPAREN) | (pkind == _COMMA)
+    nd = depth[created]
+    if len(nd) and nd.min() == 0:
+        raise StandardError('Misplaced comma in tree description', src)
+    m = n + 1
+    keys = numpy.concatenate(([0], nd * m + punct[created] + 1))
+    keys.sort(kind='mergesort')
+    nnodes = len(keys)
+    parent = numpy.empty(nnodes, numpy.int32)
+    parent[0] = -1
+    parent[1:] = numpy.searchsorted(keys, keys[1:] - m - 1, 'right') - 1
+
+    # words: runs of word characters
+    edges = numpy.zeros(n + 2, numpy.int8)
+    edges[1:-1] = kind == _WORD
+    edges = numpy.diff(edges)
+    starts = numpy.flatnonzero(edges == 1)
+    ends = numpy.flatnonzero(edges == -1)
+    prev = numpy.searchsorted(punct, starts) - 1  # structure character before word
+    if len(punct):
+        wdepth = numpy.where(prev >= 0, depth[prev], 0)
+        is_bl = (prev >= 0) & (pkind[prev] == _COLON)
+    else :
+        wdepth = numpy.zeros(len(starts), numpy.int64)
+        is_bl = numpy.zeros(len(starts), bool)
+    owner = numpy.searchsorted(keys, wdepth * m + starts + 1, 'right') - 1
+
+    bl = numpy.zeros(nnodes, numpy.float64)
+    if is_bl.any():
+        # blank everything but the branch lengths and let numpy read them
+        values = numpy.fromstring(_keep_runs(chars[:n], starts[is_bl], ends[is_bl], _BLANK), sep=' ')
+        if len(values) != is_bl.sum():
+            raise StandardError('Bad branch length in tree description', src)
+        bl[owner[is_bl]] = values
+    is_lab = ~is_bl
+    labs = _label_re.findall(_keep_runs(chars[:n], starts[is_lab], ends[is_lab], 0))
+    if "'" in src:
+        labs = [_unquote(lab) for lab in labs]
+    # later labels of the same node replace earlier ones
+    node_lab = numpy.empty(nnodes, numpy.int32)
+    node_lab.fill(-1)
+    node_lab[owner[is_lab]] = numpy.arange(len(labs), dtype=numpy.int32)
+    labelled = numpy.flatnonzero(node_lab >= 0)
+    ids, labels = _intern_labels([labs[i] for i in node_lab[labelled].tolist()])
+    del labs
+    label_ids = numpy.empty(nnodes, numpy.int32)
+    label_ids.fill(NO_LABEL)
+    label_ids[labelled] = ids
+    return ArrayTree(parent, _child_offsets(parent), bl, label_ids, labels)
+
+def read_trees(src):
+    """Returns list of ArrayTrees read from trees separated by semi-colons
+    as in a *new file"""
+    trees = []
+    for s in src.split(";"):
+        s = s.strip()
+        if len(s) > 2:  # skip empty lines
+            trees.append(from_newick(s))
+    return trees
+
+
+def write_binary(atree, f):
+    """Writes ArrayTree atree as one binary record to file object f, which
+    must be opened in binary mode."""
+    _write_record(atree, f, 0)
+
+def write_replicates(reps, f):
+    """Writes ReplicateTrees reps as one binary record to file object f:
+    the topology followed by the branch length matrix in NumPy .npy
+    format."""
+    from numpy.lib import format
+    _write_record(reps.topology, f, REPLICATES)
+    start = f.tell()
+    format.write_array(f, numpy.asarray(reps.bl_matrix(), "<f8"))
+    f.write("\0" * (_padded(f.tell() - start) - (f.tell() - start)))
+
+def save(trees, filename):
+    """Writes list of ArrayTrees and ReplicateTrees to binary tree file
+    filename"""
+    f = open(filename, "wb")
+    try:
+        for atree in trees:
+            if isinstance(atree, ReplicateTrees):
+                write_replicates(atree, f)
+            else :
+                write_binary(atree, f)
+    finally:
+        f.close()
+
+def load(filename, mmap=True):
+    """Returns list of ArrayTrees read from binary tree file filename. If
+    mmap is True the arrays are read-only views of a memory map of the
+    file, so the operating system shares and caches the pages between
+    processes loading the same file; otherwise the file is read into
+    memory. A set of replicates is returned as one ArrayTree per replicate,
+    all sharing the topology arrays."""
+    trees = []
+    for obj in _iter_records(filename, mmap):
+        if isinstance(obj, ReplicateTrees):
+            trees.extend([obj.tree(k) for k in xrange(len(obj))])
+        else :
+            trees.append(obj)
+    return trees
+
+def load_replicates(filename, mmap=True):
+    """Returns list of the ReplicateTrees in binary tree file filename. The
+    bl member of each is a matrix with one row per replicate."""
+    return [obj for obj in _iter_records(filename, mmap)
+            if isinstance(obj, ReplicateTrees)]
+
+def is_binary_file(filename):
+    """True if filename starts with a binary tree record"""
+    f = open(filename, "rb")
+    magic = f.read(len(MAGIC))
+    f.close()
+    return magic == MAGIC
+
+
+# ------- Private functions ------------ #
+def _padded(nbytes):
+    """nbytes rounded up to a multiple of 8"""
+    return (nbytes + 7) & ~7
+
+def _used_labels(atree):
+    """Returns (label ids, labels) of atree keeping only the labels its
+    nodes use, eg when the labels list is a shared TaxonNamespace list"""
+    label_ids = numpy.asarray(atree.label_ids)
+    labelled = label_ids != NO_LABEL
+    used = numpy.unique(label_ids[labelled])
+    if len(used) == len(atree.labels):
+        return label_ids, atree.labels
+    remap = numpy.zeros(len(atree.labels), numpy.int32)
+    remap[used] = numpy.arange(len(used), dtype=numpy.int32)
+    new_ids = numpy.empty(len(label_ids), numpy.int32)
+    new_ids.fill(NO_LABEL)
+    new_ids[labelled] = remap[label_ids[labelled]]
+    return new_ids, [atree.labels[i] for i in used]
+
+def _write_record(atree, f, flags):
+    n = len(atree)
+    label_ids, labels = _used_labels(atree)
+    labels = [_encode(l) for l in labels]
+    offsets = numpy.zeros(len(labels) + 1, numpy.int64)
+    numpy.cumsum([len(l) for l in labels], out=offsets[1:])
+    blob = "".join(labels)
+    sections = [numpy.asarray(atree.parent, "<i4").tostring(),
+                numpy.asarray(atree.first_child, "<i4").tostring(),
+                numpy.asarray(atree.bl, "<f8").tostring(),
+                numpy.asarray(label_ids, "<i4").tostring(),
+                offsets.astype("<i8").tostring(),
+                blob]
+    size = _HEADER_SIZE + sum([_padded(len(sec)) for sec in sections])
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, flags, n, len(labels),
+                          len(blob), size)
+    f.write(header + "\0" * (_HEADER_SIZE - len(header)))
+    for sec in sections:
+        f.write(sec + "\0" * (_padded(len(sec)) - len(sec)))
+
+def _iter_records(filename, mmap):
+    """Generator of the ArrayTrees and ReplicateTrees in a binary tree
+    file"""
+    if os.path.getsize(filename) == 0:
+        return  # save([]), an empty file cannot be mapped
+    if mmap:
+        buf = numpy.memmap(filename, numpy.uint8, "r")
+    else:
+        buf = numpy.fromfile(filename, numpy.uint8)
+    pos = 0
+    while pos < len(buf):
+        atree, flags, pos = _read_record(buf, pos)
+        if flags & REPLICATES:
+            bl, pos = _read_npy(buf, pos)
+            if bl.shape[1:] != (len(atree),):
+                raise ValueError("Replicate branch lengths do not match topology")
+            reps = ReplicateTrees(atree)
+            reps.bl = bl
+            yield reps
+        else :
+            yield atree
+
+def _read_record(buf, pos):
+    """Reads the binary record at offset pos of uint8 array buf. Returns
+    (ArrayTree, flags, offset of next record). The tree arrays are views of
+    buf."""
+    if len(buf) - pos < _HEADER_SIZE:
+        raise ValueError("Truncated binary tree record at byte %d" % pos)
+    magic, version, flags, n, nlabels, nblob, size = \
+           _HEADER.unpack(buf[pos:pos+_HEADER.size].tostring())
+    if magic != MAGIC:
+        raise ValueError("Not a binary tree record at byte %d" % pos)
+    if version > FORMAT_VERSION:
+        raise ValueError("Binary tree format version %d not supported" % version)
+    if pos + size > len(buf):
+        raise ValueError("Truncated binary tree record at byte %d" % pos)
+    end = pos + size
+    arrays = []
+    pos += _HEADER_SIZE
+    for dtype, count in (("<i4", n), ("<i4", n+1), ("<f8", n), ("<i4", n),
+                         ("<i8", nlabels+1)):
+        nbytes = count * numpy.dtype(dtype).itemsize
+        arrays.append(buf[pos:pos+nbytes].view(dtype))
+        pos += _padded(nbytes)
+    parent, first_child, bl, label_ids, offsets = arrays
+    blob = buf[pos:pos+nblob].tostring()
+    offsets = offsets.tolist()
+    labels = [blob[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    if _nonascii_re.search(blob):
+        labels = [_decode(l) for l in labels]
+    return ArrayTree(parent, first_child, bl, label_ids, labels), flags, end
+
+def _read_npy(buf, pos):
+    """Reads the .npy array at offset pos of uint8 array buf. Returns
+    (array, offset of next record). The array is a view of buf."""
+    from numpy.lib import format
+    from cStringIO import StringIO
+    if buf[pos+6] == 1:
+        start = pos + 10 + struct.unpack("<H", buf[pos+8:pos+10].tostring())[0]
+    else :
+        start = pos + 12 + struct.unpack("<I", buf[pos+8:pos+12].tostring())[0]
+    f = StringIO(buf[pos:start].tostring())
+    version = format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = format.read_array_header_1_0(f)
+    else :
+        shape, fortran, dtype = format.read_array_header_2_0(f)
+    nbytes = int(numpy.prod(shape)) * dtype.itemsize
+    if fortran or start + nbytes > len(buf):
+        raise ValueError("Bad branch length matrix at byte %d" % pos)
+    array = buf[start:start+nbytes].view(dtype).reshape(shape)
+    return array, pos + _padded(start + nbytes - pos)
+
+def _keep_runs(chars, starts, ends, fill):
+    """Returns chars as a string with everything outside the ranges
+    starts[i]:ends[i] replaced by fill"""
+    mark = numpy.zeros(len(chars) + 1, numpy.int8)
+    mark[starts] = 1
+    mark[ends] = -1
+    buf = chars.copy()
+    buf[numpy.cumsum(mark[:-1], dtype=numpy.int8) == 0] = fill
+    return buf.tostring()
+
+def _encode(label):
+    """Label as UTF-8 bytes for a binary record"""
+    if isinstance(label, unicode):
+        return label.encode("utf-8")
+    return label
+
+def _decode(label):
+    """Label read from a binary record: str if ASCII, else unicode (or the
+    bytes as written if they are not UTF-8)"""
+    if _nonascii_re.search(label):
+        try:
+            return label.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return label
+
+def _unquote(label):
+    if label[0] == "'":
+        return label[1:-1].replace("''", "'")
+    return label
+
+def _intern_labels(labs):
+    """Returns (label id array, unique label list) for list of labels"""
+    label_table = {}
+    labels = []
+    label_ids = []
+    for lab in labs:
+        if lab is None:
+            label_ids.append(NO_LABEL)
+        else:
+            lid = label_table.get(lab)
+            if lid is None:
+                lid = label_table[lab] = len(labels)
+                labels.append(lab)
+            label_ids.append(lid)
+    return numpy.array(label_ids, numpy.int32), labels
+
+def _taxon_id(namespace, label):
+    if label is None:
+        return NO_LABEL
+    return namespace.taxon_id(label)
+
+def _level_order(tree):
+    """Returns level ordered list of nodes and list of parent indices"""
+    nodes = [tree]
+    parent = [-1]
+    i = 0
+    while i < len(nodes):
+        for child in nodes[i].children:
+            nodes.append(child)
+            parent.append(i)
+        i += 1
+    return nodes, parent
+
+def _child_offsets(parent):
+    """Child offsets for a level-ordered parent array"""
+    n = len(parent)
+    counts = numpy.bincount(parent[1:], minlength=n)
+    first_child = numpy.empty(n+1, numpy.int32)
+    first_child[0] = 1
+    numpy.cumsum(counts, out=first_child[1:])
+    first_child[1:] += 1
+    return first_child
+
+
+# Main Test function
+if __name__ == '__main__':
+    import sys
+    import newick
+
+    src = open(sys.argv[1]).read()
+    for tree in newick.read_trees(src):
+        atree = from_phylotree(tree)
+        print "Nodes: %d, Bytes: %d" % (len(atree), atree.nbytes())
+        if atree.to_phylotree().write(True) == tree.write(True):
+            print "Round trip passed"
+        else:
+            print "Round trip fail"
+        if from_newick(tree.write(True)).to_phylotree().write(True) == tree.write(True):
+            print "Direct read passed"
+        else:
+            print "Direct read fail"
+        from cStringIO import StringIO
+        f = StringIO()
+        write_binary(atree, f)
+        buf = numpy.frombuffer(f.getvalue(), numpy.uint8)
+        if _read_record(buf, 0)[0].to_phylotree().write(True) == tree.write(True):
+            print "Binary round trip passed"
+        else:
+            print "Binary round trip fail"
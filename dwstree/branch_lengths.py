@@ -100,23 +100,27 @@ def bl_grafen(tree):
     node height is proportional to number of descendants. Root set to zero.
    """
    # total_height = len(tree.descendants())  # Should I normalize?
+    stats = tree.subtree_stats()
+    def ndesc(n):  # same as len(n.descendants())
+        if n.is_tip() : return 0
+        return stats[n].ndescendants + 1
     for node in tree:
-        if node.is_root() :
+        if node is tree or node.is_root() :
             node.bl=0
         else :
-            node.bl = float(len(node.parent.descendants()) - len(node.descendants())) #/ total_height
+            node.bl = float(ndesc(node.parent) - ndesc(node)) #/ total_height
 
 def bl_topo(tree):
     """Sets branch lengths according to topo method (macclade view)
     where node height is proportional to the maximum number of nodes
     descendant. Root bl set to zero."""
-    height = lambda n : max(n.nodes_to_tips())
-  #  total_height = height(tree)
+    stats = tree.subtree_stats()
+  #  total_height = stats[tree].height
     for node in tree :
-        if node.is_root() :
+        if node is tree or node.is_root() :
             node.bl=0
         else :
-            node.bl = float(height(node.parent) - height(node)) #/ total_height
+            node.bl = float(stats[node.parent].height - stats[node].height) #/ total_height
 
 def bl_bladj(tree, age_dict, age_dist_func = node_age_bladj_original, all_tips_zero=False):
     """Set node ages according to bladj algorithm and fixed nodes. Root age
@@ -137,52 +141,52 @@ def bl_bladj(tree, age_dict, age_dist_func = node_age_bladj_original, all_tips_z
 
     Function modifies tree, but not age_dict. Does not return a value.
     """
-    # assign known ages .. For now, store temp ages in .age data member of each node.
+    # assign known ages .. temp ages are stored in a dictionary keyed by node.
+    ages = {}
     for node in tree:
-        if age_dict.has_key(node.label):
-            node.age = age_dict[node.label]
-        elif node.is_tip() :
-            if all_tips_zero or "_" in node.label:
-                node.age = 0.0
-            else :
-                node.age = None
+        if node.is_tip() and (all_tips_zero or "_" in node.label):
+            ages[node] = 0.0
         else :
-            node.age = None
+            ages[node] = None
+    for label, age in age_dict.items():
+        for node in tree.nodes_by_label(label):
+            ages[node] = age
 
-    if tree.age is None  :  raise(ValueError("Error in bladj:  root node must have a fixed age"))
-    _prune_unaged_tips(tree)  ## get rid of unageable regions of tree
+    if ages[tree] is None  :  raise(ValueError("Error in bladj:  root node must have a fixed age"))
+    _prune_unaged_tips(tree, ages)  ## get rid of unageable regions of tree
 
     # main loop to find unaged nodes
     for node in tree :
-       if node.age is None : # only work on non fixed nodes
+       if ages[node] is None : # only work on non fixed nodes
            #assert(not node.is_tip())  # Should never have unaged tip.
            
            # Find descendent with fixed age nearest in age to this node's parent           
-           fd = _fixed_descendants(node) # list of all line-of-sight descendents with fixed age
+           fd = _fixed_descendants(node, ages) # list of all line-of-sight descendents with fixed age
            
-           mindist = node.parent.age - fd[0].age 
+           parent_age = ages[node.parent]
+           mindist = parent_age - ages[fd[0]]
            minindex = 0
            i = 1
            while i < len(fd):
-              dist = node.parent.age - fd[i].age
+              dist = parent_age - ages[fd[i]]
               if dist == mindist :  # We've found equivalent fixed descendents
-                  if len(_nodes_to_fixed_parent(fd[i].parent)) \
-                          < len(_nodes_to_fixed_parent(fd[minindex])):
+                  if len(_nodes_to_fixed_parent(fd[i].parent, ages)) \
+                          < len(_nodes_to_fixed_parent(fd[minindex], ages)):
                       minindex=i    # we choose shortest intervening node distance if age dist is same
               elif dist < mindist:  
                   mindist = dist
                   minindex = i
               i += 1
               
-           desc_age = fd[minindex].age  # winning node, closest fixed age
-           tofix = _nodes_to_fixed_parent(fd[minindex])
+           desc_age = ages[fd[minindex]]  # winning node, closest fixed age
+           tofix = _nodes_to_fixed_parent(fd[minindex], ages)
 
            # set node ages:
-           new_ages = age_dist_func(desc_age,node.parent.age,len(tofix))
+           new_ages = age_dist_func(desc_age,parent_age,len(tofix))
            for i,f in enumerate(tofix):
-               f.age = new_ages[i]
+               ages[f] = new_ages[i]
 
-    bl_ages(tree)  # assign the new branch lengths via the node age method
+    _bl_node_ages(tree, ages)  # assign the new branch lengths via the node ages
     
 ###############################################################
 # private functions
@@ -200,41 +204,46 @@ def get_age_dict(filename):
         a_dict[clade] = age
     return a_dict
 
-def _prune_unaged_tips(tree):
+def _prune_unaged_tips(tree, ages):
     """Remove all lineages with no fixed ages"""
-    prunelist = map(lambda y: y.label , filter(lambda x: x.age is None, tree.leaves()))
+    prunelist = map(lambda y: y.label , filter(lambda x: ages[x] is None, tree.leaves()))
     #print prunelist
     tree.prune_taxa(prunelist)
 
     
-def _fixed_descendants(node, vect=None):
+def _fixed_descendants(node, ages, vect=None):
     """ Returns list of descendants that have ages fixed in age_dict """
     if vect == None: vect = []
-    if not node.age is None:
+    if not ages[node] is None:
         vect.append(node)
         return vect
     else:
         for child in node.children:
-            _fixed_descendants(child,vect)
+            _fixed_descendants(child, ages, vect)
     return vect
 
-def _nodes_to_fixed_parent(node):
+def _nodes_to_fixed_parent(node, ages):
     """return a vector containing all ancestor nodes excluding most recent ancestor with fixed age
     """
     vect = []
     par = node.parent
-    while  par.age is None :
+    while  ages[par] is None :
         vect.append(par)
         par = par.parent
     return vect
 
+def _bl_node_ages(tree, ages):
+    """Set branch lengths from dictionary of ages keyed by node"""
+    for node in tree.postorder():
+        for child in node.children:
+            child.bl = ages[node] - ages[child]
+
 def reroot(tree, lab):
-    for node in tree:
-        if node.label == lab:
-            tree = node
-            tree.parent=None
-            return tree
-    return None # root not found
+    tree = tree.node_by_label(lab)
+    if tree is None:
+        return None # root not found
+    tree.parent=None
+    return tree
 
 ############################################################################
 # Command line script
@@ -247,6 +256,7 @@ def main():
     file.'''
     import sys   
     from optparse import OptionParser
+    from array_tree import ReplicateTrees, from_phylotree, write_binary, write_replicates
     logging.basicConfig()
 
     parser = OptionParser(usage=__usage__, version ="%prog " + __version__)
@@ -269,6 +279,10 @@ def main():
                       help="Number of replicate trees to output (only sensible with -u or -e options)")
     parser.add_option("-a", "--ages", action="store_true", dest="ageout",  \
                       default = 0, help="Output node ages")
+    parser.add_option("--precision", action="store", dest="precision",  type="int", default = 6, \
+                      help="Significant digits of output branch lengths, default=%default")
+    parser.add_option("-b", "--binary", action="store", dest="binary", default='', \
+                      help="Write trees to binary tree file rather than newick to stdout. Replicates from -r are stored as one topology and a matrix of branch lengths")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
 					  help="Print INFO messages to stdout, default=%default")    
 
@@ -277,26 +291,53 @@ def main():
     if options.verbose:
         phylo_logger.setLevel(logging.INFO)
     
-    if len(args) == 1 :
-        try :
-            src = open(args[0]).read()
+    if options.ages_file :
+        try:
+            a_dict = get_age_dict(options.ages_file)
         except IOError:
-            phylo_logger.error("Error reading tree file, %s" % args[0])
+            phylo_logger.error( "Error reading ages file: %s" % options.ages_file)
             sys.exit()
-    else :
-        src = sys.stdin.read()
+        age_dist_func = node_age_bladj_original  # default
+        if options.uniform_age_dist:
+            phylo_logger.info("Running bl_bladj with uniform age distribution")
+            age_dist_func = node_age_uniform
+        if options.exp_age_dist != 0:
+            if options.exp_age_dist < 0 :
+                reverse = True
+                options.exp_age_dist = abs(options.exp_age_dist)
+            else :
+                reverse = False
+            phylo_logger.info("Running bl_bladj with exponential age distribution, alpha=%f" % options.exp_age_dist)
+            def node_age(start,stop, n):
+                return node_age_exponential(start,stop,n,options.exp_age_dist, reverse)
+            age_dist_func = node_age
+
+    try :
+        if options.nexus:
+            from nexus_doc import NexusDoc  # no reason 
+            if len(args) == 1 :
+                infile = newick.open_file(args[0])
+            else :
+                infile = sys.stdin
+            nxdoc = NexusDoc(log = None)
+            nxdoc.load(infile.read())
+            trees = nxdoc.Trees()
+        elif len(args) == 1 :
+            # newick trees are printed as they are read
+            trees = newick.read_tree_file(args[0])  # newick or binary
+        else :
+            trees = newick.iter_trees(sys.stdin)
+    except IOError:
+        phylo_logger.error("Error reading tree file, %s" % args[0])
+        sys.exit()
 
-    if options.nexus:
-        from nexus_doc import NexusDoc  # no reason 
-        nxdoc = NexusDoc(log = None)
-        nxdoc.load(src)
-        trees = nxdoc.Trees()
-    else :
-        trees = newick.read_trees(src)
+    if options.binary:
+        outfile = open(options.binary, "wb")
 
-    result_trees= []
+    replicates = []  # ReplicateTrees objects from bladj
     
     for tree in trees:
+        reps = None
         if options.one :
             phylo_logger.info("Setting branch lengths to one")
             bl_one(tree)
@@ -307,50 +348,42 @@ def main():
             bl_topo(tree)
             phylo_logger.info("Setting branch lengths by minimal extension method")
         elif options.ages_file :
-            try:
-                a_dict = get_age_dict(options.ages_file)
-            except IOError:
-                phylo_logger.error( "Error reading ages file: %s" % options.ages_file)
-                sys.exit()
             phylo_logger.info("Running bl_bladj")
-            age_dist_func = node_age_bladj_original  # default
-            if options.uniform_age_dist:
-                phylo_logger.info("Running bl_bladj with uniform age distribution")
-                age_dist_func = node_age_uniform
-            if options.exp_age_dist != 0:
-                if options.exp_age_dist < 0 :
-                    reverse = True
-                    options.exp_age_dist = abs(options.exp_age_dist)
-                else :
-                    reverse = False
-                phylo_logger.info("Running bl_bladj with exponential age distribution, alpha=%f" % options.exp_age_dist)
-                def node_age(start,stop, n):
-                    return node_age_exponential(start,stop,n,options.exp_age_dist, reverse)
-                age_dist_func = node_age
+            # bladj prunes the same unaged tips every time, so replicates
+            # share one topology and only the branch lengths are stored.
+            newtree = tree.copy()
             for i in range(options.nreps):
-                newtree = tree.copy()
                 bl_bladj(newtree, a_dict, age_dist_func, False)
-                #t= reroot(newtree,"angiosperms")
-                #result_trees.append(t)
-                result_trees.append(newtree)
+                if reps is None:
+                    reps = ReplicateTrees(from_phylotree(newtree))
+                else :
+                    reps.add(newtree)
+            if reps is not None : replicates.append(reps)
         elif options.ageout :
             phylo_logger.info("Printing node ages")
             ages = tree.node_ages()
             for (l,a) in ages:
                 print l,a
 
-    if options.ageout:
-        return 0
-    
-    if options.nexus:
-        trees = trees + result_trees
+        if options.nexus or options.ageout:
+            continue
+        if options.binary:
+            if reps is not None:
+                write_replicates(reps, outfile)
+            elif not options.ages_file:
+                write_binary(from_phylotree(tree), outfile)
+        elif reps is not None:
+            newick.write_trees(reps.trees(), sys.stdout, True, options.precision)
+        elif not options.ages_file:
+            newick.write_trees([tree], sys.stdout, True, options.precision)
+
+    if options.binary:
+        outfile.close()
+
+    if options.nexus and not options.ageout:
+        for reps in replicates:
+            trees = trees + list(reps.trees())
         print nxdoc  
-    elif len(result_trees) > 0:
-        for t in result_trees:
-            print t, ";"
-    else:
-        for tree in trees:
-            print tree, ";"
     return 0
 
         
@@ -49,14 +49,15 @@ def compute_contrasts(tree, matrix, char, adjusted=True, split_char=None):
     split children into two groups"""
     
     result = []
+    abl = {}  # adjusted branch lengths by node
     for node in tree.postorder():
-        node.abl = node.bl # add adjusted branch length attribute to each node  [TODO: Better way?]
+        abl[node] = node.bl
         if node.is_tip() :
             node.data[char] = matrix[(node.label, char)] # put char data in data attribute
         elif node.is_polytomy():
-            result.append(_do_polytomy(node,char, adjusted, split_char))
+            result.append(_do_polytomy(node,char, abl, adjusted, split_char))
         else :
-            result.append(_do_felsenstein(node,char, adjusted))
+            result.append(_do_felsenstein(node,char, abl, adjusted))
     return result
 
 
@@ -77,14 +78,14 @@ def formatMatrix(matrix, treelist, charlist,with_ages=False):
     if with_ages : results.append('%s' % 'NodeAge')
     results.append('\n')
     for name,t in treelist.items() :
-        nodelist = [x for x in t.postorder() if not x.is_tip()]
-        for i, node in enumerate(nodelist):
+        nodes, maxd, mind, meand = t.tip_distances()[:4]
+        internal = [i for i, x in enumerate(nodes) if not x.is_tip()]
+        for i, j in enumerate(internal):
                 results.append("%s\t" % name )
                 for c in charlist :
                    results.append( "%f\t" % matrix[(name,c)][i])
                 if with_ages :
-                    L = node.length_to_tips()
-                    results.append("%f\t" % ( sum(L) / float(len(L)) ) )
+                    results.append("%f\t" % meand[j] )
                 results.append( '\n')
     return ''.join(results)  
 
@@ -96,23 +97,24 @@ def mean(values):
     """Return the arithmetic average of the values."""
     return sum(values) / float(len(values))
 
-def _do_felsenstein(node, char, adjusted=True):
+def _do_felsenstein(node, char, abl, adjusted=True):
     """Get contrasts for this node.  We assume this is a non-terminal
-    node with two children."""
+    node with two children. abl is the dictionary of adjusted branch
+    lengths."""
 
     if adjusted :
-        v1,v2 = node.children[0].abl , node.children[1].abl
+        v1,v2 = abl[node.children[0]] , abl[node.children[1]]
     else :
         v1 = 1.0; v2 = 1.0
     #extend branch length of this node to create correct variance
-    node.abl += (v1 * v2) / (v1 + v2)
+    abl[node] += (v1 * v2) / (v1 + v2)
     #Save reconstructed value for this node
     node.data[char] = (((1.0/v1)*node.children[0].data[char] \
                         + (1.0/v2)*node.children[1].data[char]))/ (1.0/v1 + 1.0/v2);   
     return (node.children[0].data[char] - node.children[1].data[char]) / math.sqrt(v1 + v2)
 
  
-def _do_polytomy(node, char, adjusted=True, split_char=None):
+def _do_polytomy(node, char, abl, adjusted=True, split_char=None):
     """Do Felsenstein contrast with Pagel method for polytomies.  If
     split_char is supplied, the polytomy is split according to this
     character, rather than the one used for contrasts."""
@@ -122,6 +124,7 @@ def _do_polytomy(node, char, adjusted=True, split_char=None):
     get_split_char = lambda n : n.data[split_char]
     children = node.children
     children.sort(sort_by_split_char) 
+    node.invalidate()
     N = len(children)
     
     middle = N/2
@@ -134,13 +137,13 @@ def _do_polytomy(node, char, adjusted=True, split_char=None):
     # get Branch lengths of two groups
     # use branch lengths only if adjusted=True
     if adjusted :
-        get_abl = lambda n : n.abl
+        get_abl = lambda n : abl[n]
         v1 = sum(map(get_abl, children[:middle] )) / float(N)
         v2 = sum(map(get_abl, children[middle:] )) / float(N)
     else :
         v1 = 1; v2 =1
 
-    node.abl += (v1 * v2) / (v1 + v2)
+    abl[node] += (v1 * v2) / (v1 + v2)
                    
     # get char values for two groups                   
     c1 = sum(map(get_char, children[:middle])) / float(N)
@@ -169,6 +172,7 @@ def main():
     '''Command line program to read trees and character values from a
     NEXUS file and produce independent contrasts.'''
     from nexus_doc import NexusDoc
+    import newick
     import math, sys
     
     try:
@@ -198,7 +202,7 @@ def main():
     (options, args) = parser.parse_args()
     if len(args) == 1 :
         try :
-            src = open(args[0]).read()
+            src = newick.open_file(args[0]).read()
         except:
             print 'Error in file, %s' % args[0]
     else :
@@ -31,34 +31,261 @@
                      
    read_trees(src) - reads list of trees separated by semi-colons as in a *new
                      file.
+
+   iter_trees(f) - generator, reads trees one at a time from a file-like
+                     object.
+
+   scan_stats(src) - tip, node and polytomy counts, depth, total branch
+                     length and parenthesis balance of a tree description,
+                     without building the tree.
+
+   read_tree_file(filename) - generator of the trees in a tree file
+                     (newick, NEXUS or binary).
+
+   read_trees_parallel(src, n_jobs) - read_trees using several processes.
+
+   write_trees(trees, out) - writes trees, one per line, to a file-like
+                     object.
+
+   write_tree_file(trees, filename) - writes trees to a tree file.
+
+   open_file(filename, mode) - opens a file, compressed or not.
+
+   Tree files named with a COMPRESSORS suffix (.gz, .bz2 or .xz) are
+   compressed and decompressed as they are streamed.
 """
 
 __author__  =    '''Dylan Schwilk (www.pricklysoft.org)'''
 
+import os
+import re
+import gzip
+import bz2
 from shlex import shlex
-from types import StringType, ListType
+from types import ListType
 from cStringIO import StringIO
-from phylotree import PhyloTree
+from phylotree import PhyloTree, TaxonNamespace
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
 
+CHUNK_SIZE = 65536  # characters read at a time by iter_trees
+JOB_PIECES = 4      # pieces of input per process in read_trees_parallel
+COMPRESSORS = (".gz", ".bz2", ".xz")  # file name suffixes of compressed files
 
-def read_trees(src) :
+def read_trees(src, node_class=PhyloTree, namespace=None) :
+    """Returns list of trees. All labels are interned in namespace (a new
+    TaxonNamespace by default), so the trees share their label strings."""
+    if namespace is None:
+        namespace = TaxonNamespace()
     trees = []
     strs = src.split(";")
     for s in strs:
         s = s.strip()
         if len(s) > 2:  # skip empty lines
-            trees.append(create_tree(s))
+            trees.append(create_tree(s, node_class, namespace))
+    return trees
+
+def read_trees_parallel(src, n_jobs=-1, as_arrays=False, node_class=PhyloTree,
+                        namespace=None) :
+    """Reads trees separated by semi-colons, as read_trees, splitting src
+    at semi-colons into pieces that are parsed in a pool of n_jobs processes
+    (see parallel.Parallel, -1 uses all CPUs). Workers return compact
+    array_tree.ArrayTree objects, so no node graphs are pickled. If
+    as_arrays is True these are returned, otherwise they are converted to
+    trees of node_class. Trees are returned in input order. The labels from
+    all workers are interned in namespace (a new TaxonNamespace by
+    default)."""
+    from parallel import Parallel, delayed, multiprocessing
+    from array_tree import read_trees as read_arrays
+    if n_jobs == -1 and multiprocessing is not None:
+        n_jobs = multiprocessing.cpu_count()
+    pieces = _split_trees(src, JOB_PIECES * max(n_jobs, 1))
+    results = Parallel(n_jobs=n_jobs)(delayed(read_arrays)(p) for p in pieces)
+    if namespace is None:
+        namespace = TaxonNamespace()
+    trees = []
+    for arrays in results:
+        for a in arrays:
+            a.labels = [namespace.intern(l) for l in a.labels]
+        if as_arrays:
+            trees.extend(arrays)
+        else :
+            trees.extend([a.to_phylotree(node_class) for a in arrays])
     return trees
 
-def create_tree(l) :
+def iter_trees(f, node_class=PhyloTree, chunk_size=CHUNK_SIZE, namespace=None) :
+    """Generator that reads trees separated by semi-colons from file-like
+    object f, chunk_size characters at a time, and yields each tree as soon
+    as it is complete. Only one tree description is held in memory. Labels
+    are interned in namespace (a new TaxonNamespace by default)."""
+    if namespace is None:
+        namespace = TaxonNamespace()
+    for s in iter_descriptions(f, chunk_size):
+        yield create_tree(s, node_class, namespace)
+
+def iter_descriptions(f, chunk_size=CHUNK_SIZE) :
+    """Generator of the tree descriptions, without semi-colons, read from
+    file-like object f chunk_size characters at a time"""
+    pieces = []  # pieces of the current tree description
+    while 1:
+        chunk = f.read(chunk_size)
+        if not chunk : break
+        strs = chunk.split(";")
+        if len(strs) == 1:
+            pieces.append(chunk)
+            continue
+        pieces.append(strs[0])
+        strs[0] = ''.join(pieces)
+        pieces = [strs.pop()]
+        for s in strs:
+            s = s.strip()
+            if len(s) > 2:  # skip empty lines
+                yield s
+    s = ''.join(pieces).strip()
+    if len(s) > 2:
+        yield s
+
+def scan_stats(src) :
+    """Returns NewickStats for newick string src (one tree description)
+    without creating any nodes. Only the punctuation and branch lengths of
+    src are examined, with numpy. Raises ValueError for a branch length
+    that is not a number."""
+    import numpy
+    if "'" in src or "[" in src:
+        src = _quoted_or_comment_re.sub(_placeholder, src)
+    kind = numpy.array(_stat_kind, numpy.int8)[numpy.frombuffer(src, numpy.uint8)]
+    pos = numpy.flatnonzero(kind)
+    kind = kind[pos]
+    step = numpy.zeros(len(kind), numpy.int64)
+    step[kind == _OPEN] = 1
+    step[kind == _CLOSE] = -1
+    depth = numpy.cumsum(step)  # parenthesis depth after each character
+
+    stats = NewickStats()
+    if len(kind) == 0:
+        return stats  # a lone tip
+    opens = numpy.flatnonzero(kind == _OPEN)
+    commas = numpy.flatnonzero((kind == _COMMA) & (depth > 0))
+    stats.ninternal = len(opens)
+    stats.ntips = 1 + int((kind == _COMMA).sum())
+    stats.balance = int(depth[-1])
+    stats.max_depth = int(depth.max())
+    stats.closed_early = bool(depth.min() < 0)
+    if len(commas):
+        # each comma belongs to the last open parenthesis at its depth
+        n = len(kind) + 1
+        keys = numpy.sort(depth[opens] * n + opens)
+        group = numpy.searchsorted(keys, depth[commas] * n + commas) - 1
+        stats.npolytomies = int((numpy.bincount(group) >= 2).sum())
+    bls = _bl_re.findall(src)
+    if bls:
+        bls = numpy.array(bls, numpy.float64)
+        stats.sum_bl = float(bls[depth[kind == _COLON] > 0].sum())  # not root
+    return stats
+
+def read_tree_file(filename, node_class=PhyloTree, namespace=None) :
+    """Returns iterator over the trees in newick tree file filename. Binary
+    tree files written by array_tree.save are recognized and loaded with a
+    memory map rather than parsed, and the trees of a NEXUS file are read
+    from its TREES blocks (see nexus_reader.iter_trees). Labels are
+    interned in namespace (a new TaxonNamespace by default)."""
+    import array_tree
+    if namespace is None:
+        namespace = TaxonNamespace()
+    if array_tree.is_binary_file(filename):
+        return _iter_binary(filename, node_class, namespace)
+    if _is_nexus(filename):
+        import nexus_reader
+        return _iter_values(nexus_reader.iter_trees(filename, node_class, namespace))
+    return iter_trees(open_file(filename), node_class, CHUNK_SIZE, namespace)
+
+def write_trees(trees, out=None, bl=True, precision=6) :
+    """Writes each tree in trees (any iterable) followed by a semicolon and
+    newline to file-like object out as it goes. If out is None the result
+    is returned as a string."""
+    if out is None:
+        out = StringIO()
+        write_trees(trees, out, bl, precision)
+        return out.getvalue()
+    for tree in trees:
+        tree.write(bl, precision, out)
+        out.write(";\n")
+
+def write_tree_file(trees, filename, bl=True, precision=6) :
+    """Writes trees to newick tree file filename, compressed according to
+    its suffix"""
+    out = open_file(filename, "w")
+    try:
+        write_trees(trees, out, bl, precision)
+    finally:
+        out.close()
+
+def open_file(filename, mode="r") :
+    """Opens filename, which is compressed if its name ends in one of the
+    COMPRESSORS suffixes. The file is (de)compressed as it is read or
+    written."""
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix not in COMPRESSORS:
+        return open(filename, mode)
+    mode = mode.replace("b", "") + "b"
+    if suffix == ".gz":
+        return gzip.open(filename, mode)
+    if suffix == ".bz2":
+        return bz2.BZ2File(filename, mode)
+    if lzma is None:
+        raise IOError("Opening .xz file %s requires the lzma module" % filename)
+    return lzma.LZMAFile(filename, mode)
+
+class NewickStats(object):
+    """Counts for one newick tree description (see scan_stats):
+          - ntips: number of leaves
+          - ninternal: number of internal nodes, including the root
+          - npolytomies: internal nodes with more than two children
+          - max_depth: maximum number of internodes from root to a tip
+          - sum_bl: sum of branch lengths, excluding the root's
+          - balance: number of '(' less number of ')'
+          - closed_early: True if a ')' has no matching '('
+    """
+    __slots__ = ('ntips', 'ninternal', 'npolytomies', 'max_depth', 'sum_bl',
+                 'balance', 'closed_early')
+
+    def __init__(self):
+        self.ntips = 1
+        self.ninternal = 0
+        self.npolytomies = 0
+        self.max_depth = 0
+        self.sum_bl = 0.0
+        self.balance = 0
+        self.closed_early = False
+
+    def nnodes(self):
+        return self.ntips + self.ninternal
+
+    def is_balanced(self):
+        """True if the parentheses match"""
+        return self.balance == 0 and not self.closed_early
+
+
+def create_tree(l, node_class=PhyloTree, namespace=None, translate=None) :
     '''Reads Newick format tree from token list, string, or file-like object
-       The function does not check for comments and expects an already-cleaned
-       up tree.'''
+       Nodes are created as node_class (PhyloTree or PhyloNode). Strings are
+       read by a single-pass scanner (see _scan_tree) which accepts quoted
+       labels and skips [comments]; a token list must already be cleaned
+       up. If namespace (a TaxonNamespace) is given the labels are interned
+       in it. Tip labels are replaced by their value in translate (a
+       dictionary such as a NEXUS TRANSLATE table), if given.'''
 
     if not type(l) is ListType :
-        l = parse(l)
+        if not isinstance(l, basestring) :
+            l = l.read()
+        return _scan_tree(l, node_class, namespace, translate)
     
-    root = PhyloTree()
+    root = node_class()
     node = root
     lp = 0
     rp = 0
@@ -66,30 +293,147 @@ def create_tree(l) :
     while t < len(l) :
         if l[t] == '(' :
             lp += 1
-            newnode = PhyloTree()
+            newnode = node_class()
             node.add_child(newnode)
             node = newnode
         elif l[t] == ')' :
             rp += 1
             node = node.parent
         elif l[t] == ',' :
-            newnode = PhyloTree()
+            newnode = node_class()
             node.parent.add_child(newnode)
             node = newnode   
         elif l[t] == ':' :
             t += 1
             node.bl =  float(l[t])
+        elif namespace is not None :
+            node.label = namespace.intern(l[t])
         else :
             node.label = l[t]
-            #print node.label
         t += 1
     if lp != rp :
         raise StandardError('Unbalanced parentheses in tree description',
                             ''.join(map(str,l)))
+    if translate :
+        root.relabel_taxa(translate)
     return root
                 
 
 # ------- Private functions ------------ #
+def _nexus_start(head):
+    """Offset just past '#NEXUS' if string head, the start of a file, is
+    a NEXUS header (after an optional UTF-8 BOM and white space), or None"""
+    m = _nexus_re.match(head)
+    if m is None:
+        return None
+    return m.end()
+
+def _is_nexus(filename):
+    """True if (possibly compressed) file filename starts with #NEXUS"""
+    f = open_file(filename)
+    try:
+        return _nexus_start(f.read(256)) is not None
+    finally:
+        f.close()
+
+def _iter_values(pairs):
+    for name, tree in pairs:
+        yield tree
+
+def _iter_binary(filename, node_class, namespace):
+    import array_tree
+    for atree in array_tree.load(filename):
+        atree.labels = [namespace.intern(l) for l in atree.labels]
+        yield atree.to_phylotree(node_class)
+
+def _split_trees(src, n) :
+    """Splits src just after semi-colons into about n pieces of similar
+    length"""
+    size = len(src) // n + 1
+    pieces = []
+    start = 0
+    while start < len(src):
+        end = src.find(';', start + size)
+        if end < 0 :
+            end = len(src)
+        pieces.append(src[start:end+1])
+        start = end + 1
+    return pieces
+
+
+# One newick token: punctuation, a quoted label (quotes doubled inside), a
+# comment, or an unquoted label or number. Leading whitespace is skipped.
+_OPEN, _CLOSE, _COMMA, _COLON = 1, 2, 3, 4
+_stat_kind = [0] * 256
+for _c, _k in zip("(),:", (_OPEN, _CLOSE, _COMMA, _COLON)):
+    _stat_kind[ord(_c)] = _k
+_nexus_re = re.compile(r"(?:\xef\xbb\xbf)?\s*#NEXUS", re.I)
+_quoted_or_comment_re = re.compile(r"'(?:[^']|'')*'|\[[^\]]*\]")
+_bl_re = re.compile(r":\s*([^\s(),:;]*)")
+
+def _placeholder(m):
+    """A quoted label becomes an unquoted word and a comment disappears"""
+    if m.group()[0] == "'":
+        return "q"
+    return ""
+
+_token_re = re.compile(r"\s*(?:([(),:;])|'((?:[^']|'')*)'|(\[[^\]]*\])|([^\s(),:;'\[\]]+))")
+
+def _scan_tree(src, node_class=PhyloTree, namespace=None, translate=None) :
+    """Builds a tree directly from a newick string in one pass over the
+    tokens. Stops at the first semicolon. Tip labels found in translate
+    are replaced as the tips are created."""
+    intern = None
+    if namespace is not None:
+        intern = namespace.intern
+    root = node_class()
+    node = root
+    depth = 0
+    pos = 0
+    bl_next = False  # next word is a branch length
+    for m in _token_re.finditer(src):
+        if m.start() != pos : break
+        pos = m.end()
+        punct, quoted, comment, word = m.groups()
+        if punct is not None:
+            if punct == '(' :
+                depth += 1
+                newnode = node_class(node)
+                node.children.append(newnode)
+                node = newnode
+            elif punct == ',' :
+                parent = node.parent
+                if parent is None :
+                    raise StandardError('Misplaced comma in tree description', src)
+                newnode = node_class(parent)
+                parent.children.append(newnode)
+                node = newnode
+            elif punct == ')' :
+                depth -= 1
+                node = node.parent
+                if node is None : break
+            elif punct == ':' :
+                bl_next = True
+            else : # ';'
+                pos = len(src)
+                break
+        elif word is not None and bl_next :
+            node.bl = float(word)
+            bl_next = False
+        elif comment is None :
+            if word is None :
+                word = quoted.replace("''", "'")
+            if translate and not node.children :  # a tip
+                word = translate.get(word, word)
+            if intern :
+                word = intern(word)
+            node.label = word
+    if depth != 0 :
+        raise StandardError('Unbalanced parentheses in tree description', src)
+    if src[pos:].strip() :
+        raise StandardError('Unexpected character at position %d in tree description' % pos, src)
+    return root
+
 class Tokenizer(shlex):
     """Provides tokens for parsing Newick-format trees"""
     def __init__(self, infile):
@@ -104,7 +448,7 @@ def parse(src):
     input is any file-like object that can be coerced into shlex,
     or a string (converted to StringIO)
     """
-    if type(input) is StringType:
+    if isinstance(src, basestring):
         src = StringIO(src)
     
     # start_pos = src.tell()
@@ -37,8 +37,9 @@ __author__ = "Dylan W. Schwilk"
 """
 
 from nexus_parser import BlockProcessor, NexusError, InputError, nx_string
-import newick, sys, operator
+import newick, nexus_reader, sys, operator
 from nexus_dict import NexusDict
+from phylotree import TaxonNamespace
 
 ##############################################################################
 ## ContinuousBlock
@@ -212,12 +213,24 @@ class TreesBlock(BlockProcessor):
 
        stores the following data:
         object["TRANSLATE"]: a TRANSLATE table
-        object["TREES"]     a dictionary containing the PhyloTree objects
+        object["TREES"]     a dictionary containing the PhyloTree objects,
+                            or None for trees not parsed yet
+
+       The description of each TREE command is stored in self.descriptions
+       and only parsed when the tree is first asked for with getTree. If
+       keep_trees is False the parsed tree is not stored, so each call
+       parses the description again; releaseTrees drops stored trees.
+
+       The labels of all trees in the block are interned in one
+       TaxonNamespace, self.namespace.
     '''
-    def __init__(self, n = 'TREES', log = sys.stdout):
+    def __init__(self, n = 'TREES', log = sys.stdout, keep_trees = True):
         BlockProcessor.__init__(self, n, log)
         self.objects["TRANSLATE"] = NexusDict()
         self.objects["TREES"] = NexusDict()
+        self.descriptions = NexusDict()
+        self.keep_trees = keep_trees
+        self.namespace = TaxonNamespace()
 
     def __repr__(self):
         return self.asString()
@@ -229,7 +242,7 @@ class TreesBlock(BlockProcessor):
         
         if with_translate:
             self.make_translate()
-            for name, tree in self.objects["TREES"].items():
+            for tree in self.trees():
                 tree.relabel_taxa(self.objects["TRANSLATE"])
             result.append("TRANSLATE")
             entries =  self.objects["TRANSLATE"].items()
@@ -239,15 +252,15 @@ class TreesBlock(BlockProcessor):
             #result.append(self.objects["TRANSLATE"].__repr__())
             
         # write the trees
-        for name, tree in self.objects["TREES"].items():
-            result.append("\tTREE %s = %s;" %(nx_string(name), tree.write(True)))
+        for name in self.objects["TREES"].keys():
+            result.append("\tTREE %s = %s;" %(nx_string(name), self.getTree(name).write(True)))
             
         result.append("END;")
         return '\n'.join(result)
 
     def make_translate(self):
             """Create translate table"""
-            tips = sum(map(lambda t:t[1].leaves(),self.objects["TREES"].items()),[])
+            tips = sum(map(lambda t:t.leaves(),self.trees()),[])
             taxa = map(lambda n:n.label, tips)
             trans = self.objects["TRANSLATE"]
             for t in taxa : trans[t]=""
@@ -257,13 +270,52 @@ class TreesBlock(BlockProcessor):
                 count += 1
                 
 
+    def getTree(self, name):
+        '''Return tree name, parsing its description if needed'''
+        t = self.objects["TREES"][name]
+        if t is None :
+            t = newick.create_tree(self.descriptions[name], namespace=self.namespace,
+                                   translate=self.objects["TRANSLATE"])
+            if self.keep_trees :
+                self.objects["TREES"][name] = t
+        return t
+
+    def trees(self):
+        '''Return list of all trees in the block'''
+        return [self.getTree(name) for name in self.objects["TREES"].keys()]
+
+    def releaseTrees(self, names = None):
+        '''Drop parsed trees (all trees if names is None) so they are parsed
+        again from their descriptions when next asked for. Changes made to
+        the released trees are lost.'''
+        if names is None :
+            names = self.objects["TREES"].keys()
+        for name in names :
+            self.objects["TREES"][name] = None
+
+    def processCommand(self, text, line):
+        '''TREE commands are stored without tokenizing the description and
+        TRANSLATE tables are split into entries at the commas. Other
+        commands are handled by BlockProcessor.processCommand'''
+        tree = nexus_reader.tree_command(text)
+        if tree is not None :
+            self.assignObject('TREE', tree[0], tree[1])
+        elif nexus_reader.command_name(text) == 'TRANSLATE' :
+            def comment(c):
+                self.commandComment(c, line)
+            for key, label in nexus_reader.translate_entries(text, comment) :
+                self.objects["TRANSLATE"][key] = self.namespace.intern(label)
+        else :
+            BlockProcessor.processCommand(self, text, line)
+
     def assignObject(self, category, object_name, object_description, format = None, has_star = 0) :
-        '''Handle assignments of type: CATEGORY * NAME = (FORMAT) = description.'''
+        '''Handle assignments of type: CATEGORY * NAME = (FORMAT) = description.
+        The tree description (newick string or token list) is stored and
+        parsed later by getTree.'''
     
         if category == 'TREE' :
-            t = newick.create_tree(object_description)
-            t.relabel_taxa(self.objects["TRANSLATE"])
-            self.objects["TREES"][object_name] = t
+            self.descriptions[object_name] = object_description
+            self.objects["TREES"][object_name] = None
             # TODO: record rootedness
         else :
             raise InputError(category, 'Unrecognized object category')
@@ -272,7 +324,8 @@ class TreesBlock(BlockProcessor):
     def doTRANSLATE(self, token_list):
         '''Reads TRANSLATE table.'''
         for i in range(0,len(token_list),3):
-            self.objects["TRANSLATE"][ token_list[i] ] =  token_list[i+1]
+            self.objects["TRANSLATE"][ token_list[i] ] = \
+                                     self.namespace.intern(token_list[i+1])
             #print self.objects["TRANSLATE"]
 
 # end: class TreesBlock
@@ -323,9 +376,7 @@ class SetsBlock(BlockProcessor):
 
 # --------------- Test --------------- #
 if __name__ == '__main__' :
-    import nexus_grammar, nexus_parser
-    reload(nexus_grammar)
-    src = open(sys.argv[1]).read()
+    import nexus_parser
     
     nx = nexus_parser.NexusParser()
     
@@ -333,7 +384,7 @@ if __name__ == '__main__' :
     nx.addRecognize('CONTINUOUS', ContinuousBlock)
     nx.addRecognize('SETS',SetsBlock)
 
-    nexus_grammar.parser.parse(src, processor = nx)
+    nx.parse(newick.open_file(sys.argv[1]))
     for k, b in nx.blocks.items():
        print b
       # pass
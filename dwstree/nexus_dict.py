@@ -63,7 +63,7 @@ class NexusDict(dict):
     def get(self, key, default):
         """Retrieve value associated with 'key' or return default value return
             default"""
-        return dict.get(self, key.upper(), default)[1]
+        return dict.get(self, key.upper(), (key, default))[1]
          
 
     def setdefault(self, key, default):
@@ -25,7 +25,8 @@
     Provides NexusDoc class
 """
 
-import nexus_grammar, sys
+import sys
+import newick
 from nexus_blocks import TreesBlock, CactusBlock, ContinuousBlock, SetsBlock
 from nexus_parser import NexusParser
 from copy import copy
@@ -46,9 +47,10 @@ class NexusDoc(NexusParser):
                which blocks are present.
 
        """
-    def __init__(self, log=sys.stdout, use_cactus_block = True):
+    def __init__(self, log=sys.stdout, use_cactus_block = True, keep_trees = True):
         NexusParser.__init__(self, log, True)
         self.title = ""
+        self.keep_trees = keep_trees  # store trees once parsed, see TreesBlock
         self.addRecognize('TREES', TreesBlock)
         self.addRecognize('CONTINUOUS', ContinuousBlock)
         self.addRecognize('CACTUS', CactusBlock)
@@ -59,13 +61,15 @@ class NexusDoc(NexusParser):
         self.charset = []
         self.missing =  '?'
 
-    def load(self, input):
-        try :
-            # see if file-like
-            input = input.read()
-        except:
-            pass
-        src = nexus_grammar.parser.parse(input, processor = self)
+    def load(self, input=None, filename=None):
+        """Read NEXUS document from input, the document text or a file-like
+        object, or from file filename (which may be compressed, see
+        newick.open_file)"""
+        if filename is not None:
+            input = newick.open_file(filename)
+        self.parse(input)
+        if self.blocks.has_key('TREES') :
+            self.blocks['TREES'].keep_trees = self.keep_trees
 
         # determine if cactus block is present.  If not,
         # get data from continuous block
@@ -100,6 +104,15 @@ class NexusDoc(NexusParser):
            self.blocks['SETS'].addAttribute('TAXSET',self.Properties()['PRUNESET'], self.pruneset)
  
          
+    def save(self, filename):
+        """Write NEXUS document to filename, compressed according to its
+        suffix"""
+        out = newick.open_file(filename, "w")
+        try:
+            out.write(repr(self))
+        finally:
+            out.close()
+
     def Taxa(self):
         "Return list of all taxa, or empty list if no Matrix"
         try :
@@ -110,15 +123,22 @@ class NexusDoc(NexusParser):
     def Tree(self, i):
         '''Return Tree by number, 1-indexed'''
         try :
-            return self.blocks['TREES'].objects['TREES'].items()[i-1][1]
-        except IndexError, KeyError :
+            block = self.blocks['TREES']
+            return block.getTree(block.objects['TREES'].keys()[i-1])
+        except (IndexError, KeyError) :
             return None
 
     def Trees(self):
-        return self.blocks['TREES'].objects['TREES'].values()
+        return self.blocks['TREES'].trees()
 
     def TreeByName(self, name):
-        return self.blocks['TREES'].objects['TREES'][name]
+        return self.blocks['TREES'].getTree(name)
+
+    def ReleaseTrees(self, names = None):
+        '''Drop parsed trees (all if names is None) to free memory; they are
+        parsed again from the file's descriptions when next asked for'''
+        if self.blocks.has_key('TREES') :
+            self.blocks['TREES'].releaseTrees(names)
 
     def TreeNames(self):
         try :
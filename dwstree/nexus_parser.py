@@ -22,19 +22,32 @@
 # 02111-1307, USA.
 
 '''
-Provides processors for NEXUS files and NEXUS blocks.  The parsers
-inherit from SimpleParse DispatchProcessor.
+Provides processors for NEXUS files and NEXUS blocks.
+
+NexusParser.parse reads a NEXUS file one command at a time with the pure
+python tokenizer in nexus_reader.py and calls the block callbacks
+(addAttribute, assignObject, doCommand) for each command, so memory use
+is bounded by the largest command.  The processors also still inherit
+from the SimpleParse DispatchProcessor, when SimpleParse is installed,
+so that the taglists of the old grammar in nexus_grammar.py can be
+dispatched to them.
 '''
 
 __version__ = "1.3"
 __author__= "Dylan Schwilk"
 
-import nexus_grammar, mx.TextTools, sys
+import re, sys
+from cStringIO import StringIO
 from nexus_dict import NexusDict   # these keeps sequence
-from simpleparse.dispatchprocessor import *
+import nexus_reader
+from nexus_reader import WORD, NUMBER, PUNCT
+try:
+    from simpleparse.dispatchprocessor import *
+except ImportError:
+    DispatchProcessor = object  # only needed by nexus_grammar
 
 # constants
-ws = mx.TextTools.set(" \t\n\r\'\"")
+_needs_quotes = re.compile("[ \t\n\r\'\"]").search
 
 #Message types
 ERROR = "ERROR"
@@ -59,6 +72,9 @@ class InputError(NexusError):
         self.expression = expression
         self.message = message
 
+    def __str__(self):
+        return "'%s' - %s" % (self.expression, self.message)
+
 
 # ------------- NexusFile ----------------#
 class NexusParser( DispatchProcessor ):
@@ -91,9 +107,78 @@ class NexusParser( DispatchProcessor ):
     def addRecognize(self, name, block_class):
         self.__recognize[name] = block_class
 
-    def logMessage(self, type, message, (start, buffer)):
+    def logMessage(self, type, message, where):
+        """Print message to log. where is the line number or a (position,
+        buffer) pair."""
         if self.log :
-            print >> self.log, "Line %d - %s: %s" % (lines(0,  start,  buffer ), type, message)
+            print >> self.log, "Line %d - %s: %s" % (_line(where), type, message)
+
+    def parse(self, src):
+        """Read NEXUS file from src, a string or file-like object, one
+        command at a time. Commands in recognized blocks are passed to the
+        block's processCommand, unrecognized blocks are stored as strings
+        if store_unrecognized is set."""
+        if isinstance(src, basestring):
+            src = StringIO(src)
+        block = None      # name of the current block
+        processor = None  # processor of the current block, None to skip
+        raw = None        # commands of a skipped block, if stored
+        first = True
+        for text, line in nexus_reader.iter_commands(src):
+            name = nexus_reader.command_name(text)
+            if first:
+                first = False
+                if name == '#NEXUS':
+                    i = text.upper().index('#NEXUS')
+                    rest = text[i+6:]
+                    line += text[i:len(text)-len(rest.lstrip())].count("\n")
+                    text = rest
+                    name = nexus_reader.command_name(text)
+            if block is None:
+                def comment(c):
+                    self.fileComment(c, line)
+                tokens = nexus_reader.tokenize(text, comment)
+                if name != 'BEGIN' :
+                    if tokens:
+                        self.logMessage(WARNING, "Command '%s' outside of block" % name, line)
+                    continue
+                if len(tokens) < 2:
+                    self.logMessage(ERROR, "Block without name", line)
+                    block = ''
+                else :
+                    block = tokens[1][1].upper()
+                if self.__recognize.has_key(block) :
+                    self.logMessage(MESSAGE, "Processing block '%s'" % block, line)
+                    processor = self.__recognize[block](log = self.log)  # create new instance of block class
+                    self.blocks[block] = processor
+                else :
+                    self.logMessage(MESSAGE, "Skipping block '%s'" % block, line)
+                    processor = None
+                    if self.store_unrecognized :
+                        raw = [text.lstrip()]
+            elif name in ('END', 'ENDBLOCK'):
+                if raw is not None :
+                    raw.append(text)
+                    self.blocks[block] = ';'.join(raw) + ';'
+                block = processor = raw = None
+            elif processor is not None:
+                try :
+                    processor.processCommand(text, line)
+                except (InputError, KeyError, ValueError, IndexError), e:
+                    self.logMessage(ERROR, "Empty or incorrect block '%s' - %s: %s"
+                                    % (block, e.__class__.__name__, e), line)
+                    processor = None  # skip the rest of the block
+            elif raw is not None:
+                raw.append(text)
+        if block is not None:
+            self.logMessage(ERROR, "Block '%s' has no END" % block, line)
+
+    def fileComment(self, text, line):
+        """Comment outside of a block"""
+        text = text.strip()
+        self.comments.append(text)
+        if text[1:2] and text[1] in nexus_reader.COMMAND_COMMENT_CHARS :
+            self.logMessage(COMMENT, text, line)
         
 
     # ------- simpleparse.dispatchprocessor taglist callbacks -----------#
@@ -216,6 +301,50 @@ class BlockProcessor( DispatchProcessor ):
         except KeyError :
             return None
 
+    def processCommand(self, text, line):
+        """Tokenize the text of a command and call addAttribute for a simple
+        assignment (CATEGORY [*] NAME = value ...), assignObject for other
+        assignments (CATEGORY [*] NAME [(FORMAT)] = tokens) or doCommand.
+        Called by NexusParser.parse; line is the line number of the
+        command, for messages."""
+        def comment(c):
+            self.commandComment(c, line)
+        tokens = nexus_reader.tokenize(text, comment)
+        if not tokens:
+            return
+        category = tokens[0][1]
+        assignments = _simple_assignment(tokens)
+        if assignments is not None:
+            has_star, assignments = assignments
+            for n, d in assignments:
+                self.addAttribute(category, n, d, has_star = has_star)
+            return
+        assignment = _complex_assignment(tokens)
+        if assignment is not None:
+            has_star, name, format, description = assignment
+            try :
+                self.assignObject(category.upper(), name, description,
+                                  format = format, has_star = has_star)
+            except InputError, e :
+                self.logMessage(ERROR, "Unrecognized input '%s' - %s" % (e.expression, e.message), line)
+            return
+        cmd = category.upper()
+        try :
+            self.doCommand(cmd, [t[1] for t in tokens[1:]])
+        except (AttributeError) :
+            self.logMessage(ERROR, "Unrecognized command '%s'" % cmd, line)
+        except InputError, e  :
+            self.logMessage(ERROR,
+                            "Command '%s' syntax error at '%s' - %s" % \
+                            (cmd, e.expression, e.message), line)
+
+    def commandComment(self, text, line):
+        """Comment inside a command. Output comments are printed to
+        self.log, others ignored. Derived classes should override this when
+        they need to preserve comments"""
+        if text[1:2] and text[1] in nexus_reader.COMMAND_COMMENT_CHARS :
+            self.logMessage(COMMENT, text.strip(), line)
+
    
     # ------- simpleparse.dispatchprocessor taglist callbacks -----------#
     # These methods will not generally be called by clients, only during
@@ -353,9 +482,80 @@ class BlockProcessor( DispatchProcessor ):
         return getString((tag,start+1,stop-1,subtags), buffer)
 
 
-    def logMessage(self, type, message, (start, buffer)):
+    def logMessage(self, type, message, where):
+        """Print message to log. where is the line number or a (position,
+        buffer) pair."""
         if self.log :
-            print >> self.log, "Line %d - %s: %s" % (lines(0,  start,  buffer ), type, message)
+            print >> self.log, "Line %d - %s: %s" % (_line(where), type, message)
+
+
+# ------- Private functions ------------ #
+def _line(where):
+    """Line number from line number or (position, buffer)"""
+    if isinstance(where, tuple):
+        start, buffer = where
+        return buffer.count("\n", 0, start) + 1
+    return where
+
+def _is_value(token):
+    return token[0] != PUNCT
+
+def _simple_assignment(tokens):
+    """Returns (has_star, list of (name, value)) if tokens are a simple
+    assignment: CATEGORY [*] NAME = value [NAME = value ...], where a value
+    is a word, number or parenthesised list of words and numbers. Otherwise
+    returns None."""
+    n = len(tokens)
+    i = 1
+    has_star = 0
+    if i < n and tokens[i] == (PUNCT, '*'):
+        has_star = 1
+        i += 1
+    result = []
+    while i < n:
+        if i + 2 >= n or not _is_value(tokens[i]) or tokens[i+1] != (PUNCT, '='):
+            return None
+        name = tokens[i][1]
+        i += 2
+        if _is_value(tokens[i]):
+            result.append((name, tokens[i][1]))
+            i += 1
+        elif tokens[i] == (PUNCT, '('):
+            j = i + 1
+            while j < n and _is_value(tokens[j]):
+                j += 1
+            if j == i + 1 or j == n or tokens[j] != (PUNCT, ')'):
+                return None
+            result.append((name, [t[1] for t in tokens[i+1:j]]))
+            i = j + 1
+        else :
+            return None
+    if not result:
+        return None
+    return has_star, result
+
+def _complex_assignment(tokens):
+    """Returns (has_star, name, format, list of values) if tokens are an
+    assignment CATEGORY [*] NAME [(FORMAT)] = tokens. Otherwise returns
+    None."""
+    n = len(tokens)
+    i = 1
+    has_star = 0
+    if i < n and tokens[i] == (PUNCT, '*'):
+        has_star = 1
+        i += 1
+    if i >= n or not _is_value(tokens[i]):
+        return None
+    name = tokens[i][1]
+    i += 1
+    format = None
+    if i + 2 < n and tokens[i] == (PUNCT, '(') and _is_value(tokens[i+1]) \
+           and tokens[i+2] == (PUNCT, ')'):
+        format = tokens[i+1][1]
+        i += 3
+    if i + 1 >= n or tokens[i] != (PUNCT, '='):
+        return None
+    return has_star, name, format, [t[1] for t in tokens[i+1:]]
 
 
 # utility functions for writing nexus files
@@ -371,7 +571,7 @@ def nx_string(s):
     elif type(s) <> type(""):
         s = str(s)
     
-    if mx.TextTools.setfind(s, ws) > -1 :
+    if _needs_quotes(s) :
         # TODO: replace ' and " with '' and ""
         return '"%s"' % s
     return s
@@ -0,0 +1,300 @@
+#! /usr/bin/env python
+
+# File: nexus_reader.py
+# Author: Dylan Schwilk
+# Copyright 2010 Dylan W. Schwilk
+
+# GNU
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+"""Streaming tokenizer for NEXUS files, in pure python.
+
+   The file is read a chunk at a time and split into commands at the
+   semicolons that are outside quoted strings and (nested) comments, so only
+   one command is held in memory at a time.  Each command is then split into
+   tokens following the same rules as the old SimpleParse grammar
+   (nexus_grammar.py):
+
+   1. punctuation characters -()\\{}/,:*+<>= are tokens of their own
+   2. strings ('...' or "...") and comments do not break words, so
+      adjacent word parts, strings and comments make one word
+   3. comments are dropped from tokens but passed to a callback, so the
+      processor can log command comments ([&...], [!...] etc)
+
+   NexusParser.parse uses these functions to call the NexusParser and
+   BlockProcessor callbacks one command at a time.  iter_trees uses them
+   directly to read the trees of large tree files (MrBayes or BEAST .t
+   files) one at a time, without a NexusDoc.
+
+   Functions:
+
+     iter_commands(f) - generator of (command text, line number)
+     command_name(text) - upper case first word of a command
+     tokenize(text) - list of (kind, value) tokens of a command
+     tree_command(text) - (name, description) of a TREE command
+     translate_entries(text) - (key, label) pairs of a TRANSLATE command
+     iter_trees(src) - generator of (name, tree) for the TREES blocks
+"""
+
+__version__ = "1.0"
+__author__  = '''Dylan Schwilk'''
+
+import re
+
+CHUNK_SIZE = 65536  # characters read at a time by iter_commands
+
+# Token kinds
+WORD, NUMBER, PUNCT = "WORD", "NUMBER", "PUNCT"
+
+COMMAND_COMMENT_CHARS = "!&%/\\@"  # after '[' marks a command comment
+
+_split_re = re.compile(r"""[;'"\[\]]""")  # characters that change state
+_comment_re = re.compile(r"[\[\]]")
+_punct = r"""-()\\{}/,:*+<>="""
+_token_re = re.compile(r"""(\s*)(?:
+      (?P<comment>\[)
+    | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?![^%(p)s\s\[\]'";])
+    | '(?P<squote>(?:[^']|'')*)'
+    | "(?P<dquote>[^"]*)"
+    | (?P<punct>[%(p)s])
+    | (?P<word>[^%(p)s\s\[\]'";]+)
+    | (?P<other>\S)
+    )""" % {'p' : re.escape(_punct)}, re.X)
+_first_word_re = re.compile(r"\s*(?:(\[)|([^%s\s\[\]'\";]+))" % re.escape(_punct))
+# TREE [*] name = description, name unquoted, 'quoted' or "quoted"
+_tree_re = re.compile(r"""\s*TREE\s+(?:\*\s*)?
+      (?:'(?P<squote>(?:[^']|'')*)'|"(?P<dquote>[^"]*)"|(?P<word>[^%s\s\[\]'";]+))
+      \s*=""" % re.escape(_punct), re.I | re.X)
+
+
+def iter_commands(f, chunk_size=CHUNK_SIZE):
+    """Generator of (text, line) for each command read from file-like object
+    f: text is the command without its semicolon and line is the line
+    number at which the command starts. Text after the last semicolon is
+    yielded as a final command if it is not blank (eg trailing comments)."""
+    pieces = []   # text of the current command
+    line = 1      # line at start of pieces
+    depth = 0     # comment nesting
+    quote = None  # open quote character
+    while 1:
+        chunk = f.read(chunk_size)
+        if not chunk : break
+        start = pos = 0
+        while 1:
+            if depth:
+                m = _comment_re.search(chunk, pos)
+            elif quote:
+                m = _quote_res[quote].search(chunk, pos)
+            else:
+                m = _split_re.search(chunk, pos)
+            if m is None:
+                break
+            c = m.group()
+            pos = m.end()
+            if depth:
+                if c == "[":
+                    depth += 1
+                else:
+                    depth -= 1
+            elif quote:
+                quote = None
+            elif c == ";":
+                pieces.append(chunk[start:m.start()])
+                text = "".join(pieces)
+                yield text, line + _leading_lines(text)
+                line += text.count("\n")
+                pieces = []
+                start = pos
+            elif c == "[":
+                depth = 1
+            elif c != "]":
+                quote = c
+        pieces.append(chunk[start:])
+    text = "".join(pieces)
+    if text.strip():
+        yield text, line + _leading_lines(text)
+
+def command_name(text):
+    """Returns the first word of command text in upper case, skipping
+    comments, or '' """
+    pos = 0
+    while 1:
+        m = _first_word_re.match(text, pos)
+        if m is None:
+            return ''
+        if m.group(2):
+            return m.group(2).upper()
+        pos = _comment_end(text, m.end())
+
+def tokenize(text, comment=None):
+    """Returns list of (kind, value) tokens of command text, where kind is
+    WORD, NUMBER or PUNCT. Quotes are removed from strings. Comments are
+    dropped; comment (a function), if given, is called with the text of
+    each comment."""
+    tokens = []
+    glue = False  # next word part joins the last token
+    pos = 0
+    n = len(text)
+    while pos < n:
+        m = _token_re.match(text, pos)
+        if m is None:
+            break  # only white space left
+        pos = m.end()
+        kind = m.lastgroup
+        if m.group(1):
+            glue = False
+        if kind == 'comment':
+            pos = _comment_end(text, pos)
+            c = text[m.start(kind):pos]
+            if comment is not None:
+                comment(c)
+            continue
+        if kind == 'punct':
+            tokens.append((PUNCT, m.group(kind)))
+            glue = False
+            continue
+        if kind == 'squote':
+            value = m.group(kind).replace("''", "'")
+        else:
+            value = m.group(kind)
+        if kind != 'number':
+            kind = WORD
+        else:
+            kind = NUMBER
+            if glue and value[0] in "-+":  # a sign is punctuation after a word
+                tokens.append((PUNCT, value[0]))
+                value = value[1:]
+                glue = False
+        if glue:
+            tokens[-1] = (WORD, tokens[-1][1] + value)
+        else:
+            tokens.append((kind, value))
+        glue = True
+    return [t for t in tokens if t[1]]  # drop empty strings
+
+def tree_command(text):
+    """Returns (name, description) of a TREE command without tokenizing
+    the tree description, or None if text does not start with TREE [*]
+    name =. Tree commands with a comment before the name or a (FORMAT) are
+    not recognized"""
+    m = _tree_re.match(text)
+    if m is None:
+        return None
+    if m.group('squote') is not None:
+        name = m.group('squote').replace("''", "'")
+    else:
+        name = m.group('dquote') or m.group('word')
+    return name, text[m.end():]
+
+def translate_entries(text, comment=None):
+    """Returns list of (key, label) for the comma separated entries of
+    TRANSLATE command text. The first token of an entry is the key and the
+    remaining tokens are joined to make the label, so unquoted labels with
+    punctuation (A-one) are kept whole. Raises ValueError for an entry
+    without a label or with words separated by white space (eg a missing
+    comma). comment is passed to tokenize"""
+    tokens = tokenize(text, comment)[1:]
+    entries = []
+    entry = []
+    for i, t in enumerate(tokens + [(PUNCT, ',')]):
+        if t != (PUNCT, ','):
+            entry.append(t)
+            continue
+        label = entry[1:]
+        kinds = [k != PUNCT for k, v in label]
+        if label and (True, True) not in zip(kinds, kinds[1:]):
+            entries.append((entry[0][1], ''.join([v for k, v in label])))
+        elif entry or i < len(tokens) - 1:  # allow a final comma
+            raise ValueError("Incorrect TRANSLATE entry '%s'"
+                             % ' '.join([v for k, v in entry]))
+        entry = []
+    return entries
+
+def iter_trees(src, node_class=None, namespace=None):
+    """Generator of (name, tree) for every tree in the TREES blocks of NEXUS
+    file src (a file name, possibly compressed, or a file-like object).
+    Tip labels are translated with the block's TRANSLATE table, and interned
+    in namespace (a TaxonNamespace) if given. Only one tree is in memory at
+    a time and commands of other blocks are skipped without tokenizing."""
+    import newick
+    if node_class is None:
+        from phylotree import PhyloTree
+        node_class = PhyloTree
+    if type(src) == type(""):
+        src = newick.open_file(src)
+    in_trees = False
+    translate = {}
+    first = True
+    for text, line in iter_commands(src):
+        name = command_name(text)
+        if first:
+            first = False
+            if name == '#NEXUS':
+                text = text[text.upper().index('#NEXUS')+6:]
+                name = command_name(text)
+        if name == 'BEGIN':
+            words = [t[1].upper() for t in tokenize(text)]
+            in_trees = words[1:2] == ['TREES']
+            translate = {}
+        elif name in ('END', 'ENDBLOCK'):
+            in_trees = False
+        elif not in_trees:
+            continue
+        elif name == 'TRANSLATE':
+            try:
+                entries = translate_entries(text)
+            except ValueError, e:
+                raise ValueError("Line %d: %s" % (line, e))
+            for k, v in entries:
+                if namespace is not None:
+                    v = namespace.intern(v)
+                translate[k] = v
+        elif name == 'TREE':
+            tree = tree_command(text)
+            if tree is None:
+                raise ValueError("Line %d: unrecognized TREE command" % line)
+            name, description = tree
+            yield name, newick.create_tree(description, node_class, namespace,
+                                           translate)
+
+
+# ------- Private functions ------------ #
+_quote_res = {"'" : re.compile("'"), '"' : re.compile('"')}
+
+def _leading_lines(text):
+    """Number of line breaks before the first non blank character"""
+    return text[:len(text) - len(text.lstrip())].count("\n")
+
+def _comment_end(text, pos):
+    """Offset just past the comment opened before pos"""
+    depth = 1
+    while depth:
+        m = _comment_re.search(text, pos)
+        if m is None:
+            return len(text)
+        if m.group() == "[":
+            depth += 1
+        else:
+            depth -= 1
+        pos = m.end()
+    return pos
+
+
+# Main Test function
+if __name__ == '__main__':
+    import sys
+    for text, line in iter_commands(open(sys.argv[1])):
+        print line, tokenize(text)
@@ -44,15 +44,17 @@ __author__  =    '''Dylan Schwilk'''
 __usage__   =    '''phylotree.py [options] [tree_file]'''
 
 
-import copy
 import logging
 import random
+import re
 phylo_logger = logging.getLogger('phylo_logger')
 
+WRITE_BUFFER = 8192  # pieces collected by write() before writing to out
+
 ######################################################################
-# Class: PhyloTree
+# Class: PhyloNode
 ######################################################################
-class PhyloTree:
+class PhyloNode(object):
     """Tree class.
 
        A tree is simply a handle to a node.  Each node contains:
@@ -60,20 +62,32 @@ class PhyloTree:
           - label : the label
           - parent: a ref to the node's parent
           - children: list of node's children
+          - data: dictionary for annotations, created on first use
+
+       PhyloNode uses __slots__ and cannot hold other attributes, which keeps
+       large trees small. Use PhyloTree if arbitrary node attributes are
+       needed.
     """
+    __slots__ = ('parent', 'children', 'label', 'bl', '_cache', '_data')
     
     def __init__(self, parent=None, bl = 0.0, label = None):
         self.parent = parent
         self.children = []
         self.label = label
         self.bl = bl
+        self._cache = None   # dict on a root with cached orders, else flag
+        self._data = None
+
+    def _get_data(self):
+        if self._data is None:
+            self._data = {}
+        return self._data
+
+    data = property(_get_data, doc="Annotation dictionary of the node")
 
     def __iter__(self):
         """The standard preorder traversal iterator."""
-        yield self
-        for subtree in self.children :
-            for child in subtree :
-                yield child
+        return iter(self._preorder())
 
     def __repr__(self) :
         return self.write(True)
@@ -81,41 +95,102 @@ class PhyloTree:
     def delete(self) :
         if self.parent :
             self.parent.children.remove(self)           
+            self.parent.invalidate()
         for subtree in self:
             del subtree
         del self
         
     def postorder(self):
         """Postorder traversal of a tree."""
-        for subtree in self.children:
-            for child in subtree.postorder():
-                yield child
-        yield self
+        return iter(self._postorder())
 
     def postorder_list(self):
         """returns postorder list of nodes"""  
-        r = []
-        for n in self.postorder():
-            r.append(n)
-        return r
+        return list(self._postorder())
 
     def preorder_list(self):
         """returns preorder list of nodes"""  
-        r = []
-        for n in self:
-            r.append(n)
-        return r
+        return list(self._preorder())
+
+    def invalidate(self):
+        """Drop the traversal orders cached on the root of the tree containing
+        this node. The mutating methods call this; call it after changing a
+        children list directly."""
+        node = self
+        while node is not None and node._cache is not None:
+            node._cache = None
+            node = node.parent
+
+    def _root_cache(self):
+        """Returns dict of values cached on this root node. Building it flags
+        every node in the tree so that invalidate() can find the root."""
+        cache = self._cache
+        if type(cache) is not dict:
+            nodes = _preorder_nodes(self)
+            for node in nodes:
+                node._cache = True
+            cache = self._cache = {'preorder' : nodes}
+        return cache
+
+    def _preorder(self):
+        """Preorder node list. Cached for roots, do not modify."""
+        if self.parent is None:
+            return self._root_cache()['preorder']
+        return _preorder_nodes(self)
+
+    def _postorder(self):
+        """Postorder node list. Cached for roots, do not modify."""
+        if self.parent is None:
+            cache = self._root_cache()
+            nodes = cache.get('postorder')
+            if nodes is None:
+                nodes = cache['postorder'] = _postorder_nodes(self)
+            return nodes
+        return _postorder_nodes(self)
+    
+    def subtree_stats(self):
+        """Returns a dictionary mapping every node of the tree to a
+        SubtreeStats object (see below). The values are computed in one
+        postorder pass and cached on the root until the tree is modified.
+        Only the topology is summarized, so branch lengths may be changed
+        freely; see subtree_lengths for branch length aggregates."""
+        if self.parent is None:
+            cache = self._root_cache()
+            stats = cache.get('stats')
+            if stats is None:
+                stats = cache['stats'] = _subtree_stats(self._postorder())
+            return stats
+        return _subtree_stats(self._postorder())
+
+    def subtree_lengths(self):
+        """Returns a dictionary mapping every node of the tree to a (length,
+        sum_bl) tuple: the maximum branch length distance from the node to a
+        tip and the sum of the branch lengths below the node. Computed in one
+        postorder pass on every call, not cached, as branch lengths are
+        assigned directly."""
+        result = {}
+        for node in self._postorder():
+            length = sum_bl = 0.0
+            for child in node.children:
+                l, s = result[child]
+                if l + child.bl > length : length = l + child.bl
+                sum_bl += s + child.bl
+            result[node] = (length, sum_bl)
+        return result
     
     def copy(self) :
-        '''Deep copy of tree.'''
-        if self.is_tip() :
-            return copy.copy(self)
-        else :
-            newnode = copy.copy(self)
-            newnode.children = []
-            for subtree in self.children :
-                newnode.add_child(subtree.copy())
-            return newnode
+        '''Deep copy of tree. Copies the tree structure, labels and branch
+        lengths only; annotations in data and other attributes are not
+        copied. Nodes keep their class.'''
+        newroot = self.__class__(bl=self.bl, label=self.label)
+        stack = [(self, newroot)]
+        while stack:
+            node, newnode = stack.pop()
+            for child in node.children:
+                newchild = child.__class__(newnode, child.bl, child.label)
+                newnode.children.append(newchild)
+                stack.append((child, newchild))
+        return newroot
 
     def ulabel(self):
         '''Returns the node label if it exists or an entire newick tree string
@@ -130,6 +205,7 @@ class PhyloTree:
             if not node.label:
                 node.label = "node%d" %n
             n = n+1
+        self.invalidate()
                 
     def nodes_to_tips(self, vect=None, n=0):
         """return a list of how many internodes are between node and its
@@ -161,18 +237,55 @@ class PhyloTree:
         """returns list of node ages for nodes in postorder order. Uses maximum 
         age if tips are non-contemporaneous
         """
-        ages = []
-        for node in self.postorder():
-            L = node.length_to_tips()
-            ages.append((node.label,max(L)))
-        return ages
+        nodes, ages = self.tip_distances()[:2]
+        return zip([node.label for node in nodes], ages.tolist())
+
+    def tip_distances(self):
+        """Returns tuple (nodes, max, min, mean, root) in one pass over the
+        tree. nodes is the list of nodes in postorder order, the others are
+        numpy arrays in the same order: maximum, minimum and mean branch
+        length distance from each node to its tips, and distance from each
+        node to the root of this (sub)tree."""
+        import numpy
+        nodes = self._postorder()
+        index = {}
+        maxd = []
+        mind = []
+        sumd = []     # sum of distances to tips
+        ntips = []
+        for i, node in enumerate(nodes):
+            index[node] = i
+            if not node.children:
+                maxd.append(0.0); mind.append(0.0); sumd.append(0.0); ntips.append(1)
+                continue
+            hi = lo = None
+            total = 0.0
+            n = 0
+            for child in node.children:
+                j = index[child]
+                bl = child.bl
+                if hi is None or maxd[j] + bl > hi : hi = maxd[j] + bl
+                if lo is None or mind[j] + bl < lo : lo = mind[j] + bl
+                total += sumd[j] + ntips[j]*bl
+                n += ntips[j]
+            maxd.append(hi); mind.append(lo); sumd.append(total); ntips.append(n)
+
+        rootd = [0.0] * len(nodes)
+        for i in xrange(len(nodes)-1, -1, -1):  # parents before children
+            d = rootd[i]
+            for child in nodes[i].children:
+                rootd[index[child]] = d + child.bl
+        return (nodes, numpy.array(maxd), numpy.array(mind),
+                numpy.array(sumd) / numpy.array(ntips), numpy.array(rootd))
 
     def distance_to_root(self):
         """Returns distance from node to the root"""
-        if not self.parent is None:
-            return self.parent.distance_to_root() + self.bl
-        else:
-            return 0
+        d = 0
+        node = self
+        while not node.parent is None:
+            d += node.bl
+            node = node.parent
+        return d
         
 
     def sum_bl(self, include_root=False) :
@@ -200,11 +313,12 @@ class PhyloTree:
         """calculate phylogenetic distance (total bl) for a set of taxa in l"""
         inodes = set()
         result = 0.0
-        for ch in self.children:
-            for node in ch.postorder():
-                if  (node in inodes) or (node.label in l):
-                    result = result + node.bl
-                    inodes.add(node.parent)
+        for node in self._postorder():
+            if node is self:
+                break
+            if  (node in inodes) or (node.label in l):
+                result = result + node.bl
+                inodes.add(node.parent)
         return result
            
     def is_root(self) :
@@ -220,52 +334,83 @@ class PhyloTree:
         """Add child to parent"""
         child.parent = self
         self.children.append(child)
+        self.invalidate()
 
     def unlink_child(self, child):
         """Unlink a child from parent and delete child."""
         self.children.remove(child)
+        self.invalidate()
         del(child)
 
     def descendants(self):
-        """Returns a list of all descendants of this node."""
-        d = []
-        if not self.is_tip():
-            d.append(self)
-            for child in self.children:
-                if child.is_tip(): d.append(child)
-                else: d=d+child.descendants()
-        return d
+        """Returns a list of all descendants of this node (including the
+        node itself, empty list for a tip)."""
+        if self.is_tip():
+            return []
+        return list(self._preorder())
 
     def leaves(self):
         """Returns a list of leaf nodes that are descendant from this
         node.  Returns a list, is not an iterator to allow modifying tree.
         """
-        lvs = []
-        if not self.is_tip():
-            for child in self.children:
-                if child.is_tip(): lvs.append(child)
-                else: lvs = lvs+child.leaves()
-        else : lvs.append(self)
-        return lvs
+        return [n for n in self._preorder() if not n.children]
 
     def leaves_by_labels(self, labels):
-        """returns list of tips that match labels in labels."""
+        """returns list of tips that match labels in labels, in the order of
+        labels."""
         lvs = []
-        for node in self:
-            if node.is_tip() and node.label in labels:
-                lvs.append(node)
+        seen = set()
+        for label in labels:
+            if label in seen : continue
+            seen.add(label)
+            for node in self.nodes_by_label(label):
+                if node.is_tip():
+                    lvs.append(node)
         return lvs       
 
+    def label_index(self):
+        """Returns dictionary mapping labels to nodes. If several nodes share
+        a label, the first one in preorder order is indexed (nodes_by_label
+        returns all of them). Cached on the root until the tree is modified;
+        assigning node.label directly requires invalidate(). Do not modify
+        the dictionary."""
+        return self._label_tables()[0]
+
+    def node_by_label(self, label):
+        """Returns the first node in preorder order with label, or None."""
+        return self._label_tables()[0].get(label)
+
+    def nodes_by_label(self, label):
+        """Returns list of all nodes with label, in preorder order."""
+        first, dups = self._label_tables()
+        if label in dups:
+            return list(dups[label])
+        if label in first:
+            return [first[label]]
+        return []
+
+    def _label_tables(self):
+        """Returns (first, dups) dictionaries: label to first node and label
+        to list of nodes for duplicated labels."""
+        if self.parent is None:
+            cache = self._root_cache()
+            tables = cache.get('labels')
+            if tables is None:
+                tables = cache['labels'] = _label_tables(self._preorder())
+            return tables
+        return _label_tables(self._preorder())
+
     def resolve(self):
         """Resolves polytomies to arbitrary zero-length bifurcating branches"""
         for node in self:
             random.shuffle(node.children)
             while len(node.children) > 2 :
-                newnode = PhyloTree(bl = 0)
+                newnode = self.__class__(bl = 0)
                 newnode.add_child(node.children.pop())
                 newnode.add_child(node.children.pop())
                 node.add_child(newnode)
-                
+        self.invalidate()
+
     def di2multi(self,tol=1e-08):
         '''Collapse multichotomies. tol is a numeric value giving the tolerance
         to consider a branch length significantly greater than zero.'''
@@ -318,124 +463,319 @@ class PhyloTree:
 
     def prune_to_taxa(self, l, normalize=False) :
         """Prunes tree leaving taxa in set or list l from tree"""
+        taxa = set(l)
         for n in self.leaves():
-            if n.label not in l :
+            if n.label not in taxa :
                 p = n.parent
                 p.unlink_child(n)
                 while p.is_tip():
                     p.parent.unlink_child(p)
                     p = p.parent
         if normalize:
-            self.normalize()          
+            self.normalize()
 
+    def induced_subtree(self, l):
+        """Returns a new tree containing only the tips with labels in l, with
+        single-child nodes removed as in normalize() (their branch lengths are
+        added to the child's). Same result as copy(), prune_to_taxa(l) and
+        normalize(), except that children keep their original order. Built in
+        one postorder pass; this tree is not modified. Only labels and branch
+        lengths are copied. Returns None if no tips match."""
+        taxa = set(l)
+        if not self.children:
+            if self.label in taxa:
+                return self.__class__(bl=self.bl, label=self.label)
+            return None
+        new = {}  # node -> node in new tree (or the collapsed node below it)
+        for node in self._postorder():
+            if not node.children:
+                if node.label in taxa:
+                    new[node] = self.__class__(bl=node.bl, label=node.label)
+                continue
+            kept = [new.pop(c) for c in node.children if c in new]
+            if not kept:
+                continue
+            if node is self:
+                break
+            if len(kept) == 1:
+                kept[0].bl += node.bl
+                new[node] = kept[0]
+            else :
+                newnode = new[node] = self.__class__(bl=node.bl, label=node.label)
+                newnode.children = kept
+                for c in kept:
+                    c.parent = newnode
+        else :
+            return None  # no children kept at root
 
-        
-    def write(self, bl=False):
-        result = ''
-        if self.children :
-            l = len(self.children)
-            result =  "("
-            for i in range(l) : 
-                if i < l-1 : result = result + self.children[i].write(bl) + ','
-                else : result = result + self.children[i].write(bl)
-            result = result + ')'
-        if self.label :
-            result += self.label
-        if bl : # and self.parent : # root is allowed to have bl
-            result += ':%g' % self.bl
-        return result
+        root = self.__class__(bl=self.bl, label=self.label)
+        if len(kept) == 1 and kept[0].children:
+            # root keeps its label and bl, takes the single child's children
+            thechild = kept[0]
+            kept = thechild.children
+            for c in kept:
+                c.bl += thechild.bl
+        root.children = kept
+        for c in kept:
+            c.parent = root
+        return root
 
- 
-    def write2(self,bl=False):
-        if self.children :
-            r = ["(", ",".join(map(lambda x: x.write(bl), self.children)),")"]
-        else :
-            r = []
-        if self.label :
-            r.append(self.label)
-        if bl :
-            r.append(":%g" % self.bl)
-        return "".join(r)
-    
-    def write3(self,bl=False):
-        if self.children :
-            r = "("
-            for c in self.children[:-1]:
-                r += c.write(bl) +","
-            r += self.children[-1].write(bl) + ")"
-        else :
-            r = ""
-        if self.label :
-            r+=self.label
-        if bl :
-            r+=":%g" % self.bl
-        return r
+
+        
+    def write(self, bl=False, precision=6, out=None):
+        """Returns newick description of the tree (without the final
+        semicolon). If bl is True branch lengths are included, with precision
+        significant digits; the root's branch length is written too. If out
+        is a file-like object the description is written to it in pieces and
+        None is returned. Iterative, so deep trees are fine."""
+        blfmt = ':%%.%dg' % precision
+        result = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, basestring):
+                result.append(node)
+                if out is not None and len(result) > WRITE_BUFFER:
+                    out.write(''.join(result))
+                    result = []
+                continue
+            if node.label :
+                tail = _quote_label(node.label)
+            else :
+                tail = ''
+            if bl :
+                tail += blfmt % node.bl
+            if node.children:
+                result.append('(')
+                stack.append(')' + tail)
+                children = node.children
+                for i in range(len(children)-1, 0, -1):
+                    stack.append(children[i])
+                    stack.append(',')
+                stack.append(children[0])
+            else :
+                result.append(tail)
+        if out is None:
+            return ''.join(result)
+        out.write(''.join(result))
     
     def make_pectinate(self):
         """
         Order descendant branches according to their size, so largest
         subtrees are first.  For branches with equal number of
-        children, order by label.
+        children, order by label.  Same as ladderize().
 
         TODO: provide reverse sort. Solved: Easiest to make_pectinate then use
         reverse()
         """
-        def sort_func(n1, n2):
-            if n1.is_tip() and n2.is_tip():
-                #return 0  # could have it ignore labels
-                return cmp(n1.label, n2.label)
-            else:
-                n1lvs = n1.leaves()
-                n2lvs = n2.leaves()
-                l1 = len(n1lvs)
-                l2 = len(n2lvs)
-                if l1 > l2:
-                    return -1
-                elif l1 == l2:
-                    #return 0
-                    lab1 = map(lambda x:x.label, n1lvs); lab1.sort()
-                    lab2 = map(lambda x:x.label, n2lvs); lab2.sort()
-                    return cmp(lab1, lab2)
-                elif l1 < l2:
-                    return 1
-
-        # now the actual sort
-        for node in self.postorder_list():
-            node.children.sort(sort_func)
+        self.ladderize()
+
+    def ladderize(self):
+        """Sort children into canonical order: larger subtrees (more leaves)
+        first, ties broken by the smallest leaf label in each subtree. Two
+        trees with unique tip labels have the same topology if and only if
+        they write identically after ladderize(). Linear time apart from
+        sorting each node's children."""
+        keys = _ladder_keys(self._postorder())
+        for node in keys:
+            if len(node.children) > 1:
+                node.children.sort(key=keys.__getitem__)
+        self.invalidate()
+
+    def canonical_form(self, with_bl=False, precision=6):
+        """Returns newick string of the tree in ladderize() order without
+        modifying the tree. Internal node labels and the root branch length
+        are left out; if with_bl is True branch lengths are included, rounded
+        to precision significant digits. Trees with unique tip labels are
+        equivalent if and only if their canonical forms are equal."""
+        keys = _ladder_keys(self._postorder())
+        out = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, basestring):
+                out.append(node)
+                continue
+            if with_bl and node is not self:
+                blstr = ':%.*g' % (precision, node.bl)
+            else :
+                blstr = ''
+            if node.children:
+                out.append('(')
+                stack.append(')' + blstr)
+                children = sorted(node.children, key=keys.__getitem__)
+                for i in range(len(children)-1, 0, -1):
+                    stack.append(children[i])
+                    stack.append(',')
+                stack.append(children[0])
+            elif node.label :
+                out.append(_quote_label(node.label) + blstr)
+            else :
+                out.append(blstr)
+        return ''.join(out)
+
+    def splits(self, taxon_index=None, include_trivial=False):
+        """Returns dictionary mapping each clade (split) of the tree to its
+        branch length. A clade is an int bitset of its leaves: bit
+        taxon_index[label] is set for every leaf. taxon_index defaults to
+        the sorted tip labels of this tree; use a shared index (see
+        splits.taxon_index) to compare trees. The root clade is left out, as
+        are single-leaf clades unless include_trivial is True. Nodes with a
+        single child have the same clade as the child and add their branch
+        length to it."""
+        if taxon_index is None:
+            labels = [n.label for n in self.leaves()]
+            labels.sort()
+            taxon_index = dict([(l, i) for i, l in enumerate(labels)])
+        bits = {}
+        result = {}
+        for node in self._postorder():
+            if node.children:
+                b = 0
+                for child in node.children:
+                    b |= bits.pop(child)
+            else :
+                b = 1 << taxon_index[node.label]
+            bits[node] = b
+            if node is self : break
+            if include_trivial or b & (b - 1):  # more than one leaf
+                result[b] = result.get(b, 0.0) + node.bl
+        result.pop(bits[self], None)  # single-child root
+        return result
+
+    def canonical_hash(self, with_bl=False, precision=6):
+        """Hash of canonical_form(). Equal for equivalent trees."""
+        return hash(self.canonical_form(with_bl, precision))
 
     def reverse(self) :
         '''Reverse order of all nodes.'''
-        for child in self.children:
-            if not child.is_tip() : child.reverse()
-        self.children.reverse()
+        for node in self.preorder_list():
+            node.children.reverse()
+        self.invalidate()
 
 
     def relabel_taxa(self, thedict):
         '''relabels tips by translating from dictionary.'''
         for l in self.leaves():
             l.label = thedict.get(l.label,l.label) # default is just to keep old label
+        self.invalidate()
+
+
+## End: PhyloNode class
+######################################################################
+
+
+class SubtreeStats(object):
+    """Aggregate values for the subtree below a node:
+          - nleaves: number of leaves (1 for a tip)
+          - ndescendants: number of nodes below the node
+          - height: maximum number of internodes to a tip
+    """
+    __slots__ = ('nleaves', 'ndescendants', 'height')
+
+    def __init__(self, nleaves=1, ndescendants=0, height=0):
+        self.nleaves = nleaves
+        self.ndescendants = ndescendants
+        self.height = height
 
 
+######################################################################
+# Class: PhyloTree
+######################################################################
+class PhyloTree(PhyloNode):
+    """Tree class. Same as PhyloNode, but nodes also accept arbitrary
+    attributes (each node carries an instance dictionary)."""
+    pass
+
 ## End: PhyloTree class
 ######################################################################
 
 
+######################################################################
+# Class: TaxonNamespace
+######################################################################
+class TaxonNamespace(object):
+    """Table of taxon labels shared by many trees (eg the trees of one tree
+    file or TREES block). Readers given a namespace store the one shared
+    string object for each label, so the trees hold a single copy of every
+    label and label comparisons between them (dictionary and set lookups in
+    prune_to_taxa, relabel_taxa, induced_subtree, canonical_form ...)
+    succeed on identity. Each label also gets a permanent integer id, in
+    order of first appearance.
+
+       Data members:
+          - labels: list of labels, indexed by id
+    """
+
+    def __init__(self, labels=()):
+        self.labels = []
+        self._ids = {}
+        for label in labels:
+            self.intern(label)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self._ids
+
+    def intern(self, label):
+        """Returns the shared copy of label, adding it if it is new"""
+        lid = self._ids.get(label)
+        if lid is None:
+            self._ids[label] = len(self.labels)
+            self.labels.append(label)
+            return label
+        return self.labels[lid]
+
+    def taxon_id(self, label):
+        """Returns the integer id of label, adding it if it is new"""
+        lid = self._ids.get(label)
+        if lid is None:
+            lid = self._ids[label] = len(self.labels)
+            self.labels.append(label)
+        return lid
+
+    def intern_tree(self, tree):
+        """Replaces the labels of all nodes of tree by their shared copies"""
+        for node in tree:
+            if node.label is not None:
+                node.label = self.intern(node.label)
+
+## End: TaxonNamespace class
+######################################################################
+
+
 
 ######################################################################
 ## Utility functions
 ######################################################################
 
-def equivalent(a, b, with_bl = False):
-    """Tests for equivalent trees.
+def equivalent(a, b, with_bl = False, precision=6):
+    """Tests for equivalent trees (same topology and tip labels, and same
+       branch lengths to precision significant digits if with_bl is True).
        This is useful for eliminating topologically equivilant trees,
        for example, in implementing a function such as PAUP's
-       'condense trees.'
+       'condense trees.'  Assumes tip labels are unique.
     """
-    pa = a.copy()
-    pb = b.copy()
-    pa.make_pectinate()
-    pb.make_pectinate()
-    return __clade_equiv(pa,pb, with_bl)
+    return a.canonical_form(with_bl, precision) == b.canonical_form(with_bl, precision)
+
+def condense_trees(trees, with_bl=False, precision=6):
+    """Removes duplicate trees, as PAUP's 'condense trees'.  Returns list of
+    (tree, count) tuples for the distinct trees in order of first
+    appearance. Trees are compared by canonical_form() so the cost is linear
+    in the total number of nodes. Assumes tip labels are unique."""
+    result = []
+    index = {}
+    for tree in trees:
+        key = tree.canonical_form(with_bl, precision)
+        i = index.get(key)
+        if i is None:
+            index[key] = len(result)
+            result.append([tree, 1])
+        else :
+            result[i][1] += 1
+    return [tuple(r) for r in result]
 
 
 def count_polytomies(tree):
@@ -450,26 +790,93 @@ def count_polytomies(tree):
 ## Private Utility functions
 ######################################################################
 
-def __clade_equiv(a,b, with_bl = False):
-    '''Assumes both clades are sorted by pectinate. Private.'''
-    if a.is_tip() and b.is_tip():
-        if a.label != b.label : return False
-        else : return True
-    else :
-        if len(a.children) == len(b.children) :
-            for i in range(len(a.children)):
-                if not __clade_equiv(a.children[i],b.children[i],with_bl):
-                    return False
+_needs_quotes = re.compile(r"[\s(),:;'\[\]]").search
+
+def _quote_label(label):
+    """Returns label, quoted for newick output if it contains whitespace or
+    newick punctuation"""
+    if _needs_quotes(label):
+        return "'%s'" % label.replace("'", "''")
+    return label
+
+def _preorder_nodes(node):
+    """Iterative preorder traversal, returns list of nodes."""
+    result = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        result.append(n)
+        if n.children:
+            stack.extend(n.children[::-1])
+    return result
+
+def _subtree_stats(postorder):
+    """Fill SubtreeStats for a postorder list of nodes."""
+    stats = {}
+    for node in postorder:
+        if not node.children:
+            stats[node] = SubtreeStats()
+            continue
+        nleaves = ndesc = height = 0
+        for child in node.children:
+            s = stats[child]
+            nleaves += s.nleaves
+            ndesc += s.ndescendants + 1
+            if s.height >= height : height = s.height + 1
+        stats[node] = SubtreeStats(nleaves, ndesc, height)
+    return stats
+
+def _label_tables(preorder):
+    """Label index for a preorder list of nodes, see PhyloNode.label_index"""
+    first = {}
+    dups = {}
+    for node in preorder:
+        label = node.label
+        if label is None : continue
+        if label in first:
+            if label in dups:
+                dups[label].append(node)
+            else :
+                dups[label] = [first[label], node]
         else :
-            return False
-    return True
-
+            first[label] = node
+    return first, dups
+
+def _ladder_keys(postorder):
+    """ladderize() sort keys, (-number of leaves, smallest leaf label), for a
+    postorder list of nodes. Unlabeled leaves count as label ''."""
+    keys = {}
+    for node in postorder:
+        if not node.children:
+            keys[node] = (-1, node.label or '')
+            continue
+        nleaves, minlabel = keys[node.children[0]]
+        nleaves = -nleaves
+        for child in node.children[1:]:
+            n, label = keys[child]
+            nleaves -= n
+            if label < minlabel : minlabel = label
+        keys[node] = (-nleaves, minlabel)
+    return keys
+
+def _postorder_nodes(node):
+    """Iterative postorder traversal, returns list of nodes. Reverse of a
+    preorder traversal that visits children right to left."""
+    result = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        result.append(n)
+        stack.extend(n.children)
+    result.reverse()
+    return result
 
 if __name__ == "__main__":
     '''Command line program.  '''
     import sys
     import newick
     from optparse import OptionParser
+    logging.basicConfig()
 
     parser = OptionParser(usage=__usage__, version ="%prog " + __version__)
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
@@ -482,26 +889,25 @@ if __name__ == "__main__":
     
     if len(args) == 1 :
         try :
-            src = open(args[0]).read()
+            infile = newick.open_file(args[0])
         except IOError:
             phylo_logger.error('Error reading file, %s' % args[0])
             sys.exit()
     else :
-        src = sys.stdin.read()
-
-    trees = newick.read_trees(src)
+        infile = sys.stdin
 
-
-    for tree in trees:
-        p = count_polytomies(tree)
-        print "N polytomies", p
-
-        t = len(tree.leaves())
-        n = len(tree.descendants())+1
-
-        print "Taxa: %d, Nodes: %d" % (t,n)
-        #tree.normalize()
-        #print tree.write(True) + ";"
+    # Scan the descriptions, no trees are built
+    for i, src in enumerate(newick.iter_descriptions(infile)):
+        try :
+            s = newick.scan_stats(src)
+        except ValueError, e:
+            phylo_logger.error('Tree %d: bad branch length, %s' % (i+1, e))
+            continue
+        print "N polytomies", s.npolytomies
+        print "Taxa: %d, Nodes: %d" % (s.ntips, s.nnodes())
+        print "Max depth: %d, Total bl: %s, Paren balance: %d" % (s.max_depth, s.sum_bl, s.balance)
+        if not s.is_balanced():
+            phylo_logger.error('Tree %d: unbalanced parentheses' % (i+1))
         
 
     
@@ -126,12 +126,11 @@ def tdpd(tree,taxa,nreps):
     return (td, pd)  
 
 def reroot(tree, lab):
-    for node in tree:
-        if node.label == lab:
-            tree = node
-            tree.parent=None
-            return tree
-    return None # root not found
+    tree = tree.node_by_label(lab)
+    if tree is None:
+        return None # root not found
+    tree.parent=None
+    return tree
 
 def read_species_from_taxa_file(fname):
     """Read tips names from a phylomatic/treematic taxa file. Throws away
@@ -159,6 +158,26 @@ def getz(t,tx,reps):
     return linear_reg_fixed2(numpy.log10(x),numpy.log10(y),numpy.log10(FIXED_INTERCEPT))
 
 
+def write_simulated(trees, sim_type, filename):
+    """Write simulated trees to binary tree file. The BLADJ simulations only
+    change branch lengths so their trees are saved as one set of replicates
+    and the NONE simulation as a single tree."""
+    from dwstree import array_tree
+    if not trees:
+        records = []  # eg no replicates
+    elif sim_type.startswith("BLADJ"):
+        reps = array_tree.ReplicateTrees(array_tree.from_phylotree(trees[0]))
+        for t in trees[1:]:
+            reps.add(t)
+        records = [reps]
+    elif sim_type == "NONE":
+        records = [array_tree.from_phylotree(trees[0])]
+    else :
+        records = [array_tree.from_phylotree(t) for t in trees]
+    array_tree.save(records, filename)
+    phylo_logger.info("Wrote %d trees to %s" % (len(trees), filename))
+
+
 def main():
     """Command line program."""
     import sys   
@@ -181,6 +200,9 @@ def main():
     parser.add_option("-r", "--reps", action="store", type="int", \
                       dest="toporeps",  default = TOPO_REPS, \
                       help="Number of replicate simulated phylogenies (resolutions or branch lengths) to explore. Default=%d" % TOPO_REPS)        
+    parser.add_option("-w", "--write-trees", action="store", type="string", \
+                      dest="tree_file",  default = '', \
+                      help="Write the simulated phylogenies to a binary tree file. BLADJ replicates are stored as one topology and a matrix of branch lengths")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
 					  help="Print INFO messages to stdout, default=%default")    
 
@@ -191,17 +213,17 @@ def main():
     
     if len(args) == 1 :
         try :
-            src = open(args[0]).read()
+            src = newick.open_file(args[0]).read()
         except IOError:
             phylo_logger.error("Error reading tree file, %s" % args[0])
             sys.exit()
     else :
         src = sys.stdin.read()
        
-    tree = newick.read_trees(src)[0]  ## should contain 1 megatree with full
-                                      ## taxa as methods apply branch lengths
-                                      ## and resoltuion before pruning to
-                                      ## species set in taxa file.
+    tree = newick.read_trees(src, phylotree.PhyloNode)[0]  ## should contain 1 megatree with full
+                                                           ## taxa as methods apply branch lengths
+                                                           ## and resoltuion before pruning to
+                                                           ## species set in taxa file.
     # read taxa from phylomatic-style taxa file
     taxa = read_species_from_taxa_file(options.taxa_file)
     phylo_logger.info("Read taxa file with %d taxa" % len(taxa))
@@ -217,27 +239,22 @@ def main():
     params = []     # vector of parameters for each phylogeny
     if options.sim_type == "NONE":
         bl_bladj(tree, age_dict) # standard bladj
-        tree.prune_to_taxa(taxa)
-        tree.normalize()
-        #print tree
-        for i in range(options.toporeps):        
-            testtrees.append(tree.copy())
+        ctree = tree.induced_subtree(taxa)
+        #print ctree
+        for i in range(options.toporeps):  # tdpd does not modify the tree
+            testtrees.append(ctree)
             params.append((options.taxa_file, options.sim_type))
     elif options.sim_type == "RESOLVE":
         for i in range(options.toporeps):
             ntree = tree.copy()
             ntree.resolve() # random resolution
             bl_bladj(ntree, age_dict) # original bladj
-            ntree.prune_to_taxa(taxa)
-            ntree.normalize() ## reduce nodes to make traversing faster
-            testtrees.append(ntree)
+            testtrees.append(ntree.induced_subtree(taxa))
             params.append((options.taxa_file, options.sim_type))
     elif options.sim_type == "BLADJ_UNIFORM" :
         for i in range(options.toporeps):
             bl_bladj(tree, age_dict, node_age_uniform)
-            tree.prune_to_taxa(taxa)
-            tree.normalize() ## reduce nodes to traverse
-            testtrees.append(tree.copy())
+            testtrees.append(tree.induced_subtree(taxa))
             params.append((options.taxa_file, options.sim_type))            
     elif options.sim_type == "BLADJ_EXP":
         for alpha in ALPHAS:
@@ -245,14 +262,15 @@ def main():
                 agefunc = lambda start,stop,n : node_age_exponential(start,stop,n,alpha,reverse)
                 for i in range(options.toporeps):
                     bl_bladj(tree, age_dict, agefunc)
-                    tree.prune_to_taxa(taxa)
-                    tree.normalize() ## reduce nodes to traverse
-                    testtrees.append(tree.copy())
+                    testtrees.append(tree.induced_subtree(taxa))
                     params.append((options.taxa_file, options.sim_type, alpha, reverse))
     else:
         phylo_logger.error("-s options not recognized.  Possible simulations \
                               types are NONE (default), RESOLVE, BLADJ_UNIFORM, or BLADJ_EXP")
 
+    if options.tree_file:
+        write_simulated(testtrees, options.sim_type, options.tree_file)
+
     ### TEST CODE TO OUTPUT RAW TD-PD bivariate data ###
     if True :
         for i, t in enumerate(testtrees):
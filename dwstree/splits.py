@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+
+# File: splits.py
+# Author: Dylan Schwilk
+# Copyright 2010 Dylan W. Schwilk
+
+# GNU
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+"""Distances between rooted trees based on their clades (splits).
+
+   Each clade is an int bitset over a taxon index shared by all trees (see
+   PhyloNode.splits).  The splits of a set of trees are collected in one
+   table mapping each distinct split to a column number, so that a tree is a
+   sparse row of branch lengths.  The distance matrices are then built from
+   products of these rows, accumulated over batches of columns to bound
+   memory.
+
+   Functions:
+
+     taxon_index(trees) - shared label to bit dictionary for trees
+     split_table(trees, index) - distinct splits and per tree rows
+     rf_distance(a, b) - Robinson-Foulds distance between two trees
+     rf_matrix(trees) - pairwise Robinson-Foulds distances
+     branch_score_matrix(trees) - pairwise branch score distances
+"""
+
+__version__ = "1.0"
+__author__  = '''Dylan Schwilk'''
+__usage__   = '''splits.py [options] [tree_file]'''
+
+import numpy
+
+BATCH = 4096  # number of split columns expanded at a time
+
+
+def taxon_index(trees):
+    """Returns dictionary mapping every tip label in trees to a bit number,
+    in sorted label order."""
+    labels = set()
+    for tree in trees:
+        labels.update([n.label for n in tree.leaves()])
+    labels = list(labels)
+    labels.sort()
+    return dict([(l, i) for i, l in enumerate(labels)])
+
+def split_table(trees, index=None, include_trivial=False):
+    """Returns (table, rows). table maps each distinct split in trees to a
+    column number. rows holds one (columns, branch lengths) pair of arrays
+    per tree."""
+    if index is None:
+        index = taxon_index(trees)
+    table = {}
+    rows = []
+    for tree in trees:
+        s = tree.splits(index, include_trivial)
+        cols = numpy.empty(len(s), numpy.int32)
+        bls = numpy.empty(len(s), numpy.float64)
+        for i, (split, bl) in enumerate(s.iteritems()):
+            col = table.get(split)
+            if col is None:
+                col = table[split] = len(table)
+            cols[i] = col
+            bls[i] = bl
+        rows.append((cols, bls))
+    return table, rows
+
+def rf_distance(a, b, index=None):
+    """Robinson-Foulds distance between two rooted trees: the number of
+    clades found in only one of them."""
+    if index is None:
+        index = taxon_index([a, b])
+    sa = set(a.splits(index))
+    sb = set(b.splits(index))
+    return len(sa ^ sb)
+
+def rf_matrix(trees, index=None, batch=BATCH):
+    """Returns matrix of pairwise Robinson-Foulds distances between trees."""
+    table, rows = split_table(trees, index)
+    rows = [(cols, numpy.ones(len(cols))) for cols, bls in rows]
+    shared = _gram(rows, len(table), batch)
+    n = numpy.diag(shared)
+    return (n[:, numpy.newaxis] + n[numpy.newaxis, :] - 2 * shared).astype(int)
+
+def branch_score_matrix(trees, index=None, batch=BATCH):
+    """Returns matrix of pairwise branch score distances (Kuhner and
+    Felsenstein 1994) between trees: the square root of the summed squared
+    differences in branch length over all clades, including tips. A clade
+    missing from a tree has length 0."""
+    table, rows = split_table(trees, index, True)
+    prod = _gram(rows, len(table), batch)
+    sq = numpy.diag(prod)
+    d = sq[:, numpy.newaxis] + sq[numpy.newaxis, :] - 2 * prod
+    numpy.clip(d, 0.0, None, out=d)  # rounding error
+    return numpy.sqrt(d)
+
+
+# ------- Private functions ------------ #
+def _gram(rows, ncols, batch):
+    """Returns W W' for the sparse rows of W, expanding batch columns of W
+    at a time"""
+    ntrees = len(rows)
+    result = numpy.zeros((ntrees, ntrees))
+    block = numpy.zeros((ntrees, min(batch, ncols)))
+    for start in xrange(0, ncols, batch):
+        stop = min(start + batch, ncols)
+        block[:] = 0.0
+        for i, (cols, vals) in enumerate(rows):
+            sel = (cols >= start) & (cols < stop)
+            block[i, cols[sel] - start] = vals[sel]
+        w = block[:, :stop-start]
+        result += numpy.dot(w, w.T)
+    return result
+
+
+# Main Test function
+if __name__ == '__main__':
+    import sys
+    import newick
+    from optparse import OptionParser
+
+    parser = OptionParser(usage=__usage__, version ="%prog " + __version__)
+    parser.add_option("-b", "--branch-score", action="store_true", dest="bscore", default=False,
+                      help="Print branch score distances rather than Robinson-Foulds distances, default=%default")
+    (options, args) = parser.parse_args()
+
+    if len(args) == 1 :
+        src = newick.open_file(args[0]).read()
+    else :
+        src = sys.stdin.read()
+    trees = newick.read_trees(src)
+    if options.bscore:
+        m = branch_score_matrix(trees)
+    else :
+        m = rf_matrix(trees)
+    for row in m:
+        print " ".join([str(x) for x in row])
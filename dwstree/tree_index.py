@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+
+# File: tree_index.py
+# Author: Dylan Schwilk
+# Copyright 2010 Dylan W. Schwilk
+
+# GNU
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+"""Random access to the trees in large tree files.
+
+   A TreeIndex records the byte offsets of each tree description in a newick
+   file or in the TREES block of a NEXUS file, so that tree k, a range of
+   trees or every n-th tree (eg removing burn-in and thinning MCMC samples)
+   can be read without parsing the rest of the file.  Building the index
+   scans the file for command ends but creates no trees.  The index is
+   saved next to the tree file (filename + INDEX_SUFFIX) and reused as long
+   as the size and modification time of the tree file are unchanged.
+
+   Functions:
+
+     build_index(filename) - scan tree file and return its TreeIndex
+     load_index(filename) - saved TreeIndex of filename, building it if needed
+"""
+
+__version__ = "1.0"
+__author__  = '''Dylan Schwilk'''
+__usage__   = '''tree_index.py [options] tree_file'''
+
+import os
+import re
+import mmap
+
+import numpy
+
+import newick
+import nexus_reader
+from phylotree import PhyloTree
+
+INDEX_SUFFIX = ".tidx"
+
+_nonblank_re = re.compile(r"\S")
+_special_re = re.compile(r"[';\[]")        # quote, end of command, comment
+_comment_re = re.compile(r"[\[\]]")
+_quoted_re = re.compile(r"'(?:[^']|'')*'")
+_word_re = re.compile(r"\s*(?:(\[)|([A-Za-z]+))")
+_tree_name_re = re.compile(r"\s*(?:\*\s*)?(?:'(?:[^']|'')*'|[^\s=]+)\s*=")
+
+
+class TreeIndex(object):
+    """Byte offsets of the tree descriptions in a tree file.
+
+       Data members:
+          - filename: the tree file
+          - offsets: int64 array with one (start, end) row per tree; the
+            description is the bytes start:end, without the semicolon
+          - blocks: int32 array, the NEXUS TREES block of each tree (-1 in
+            a newick file)
+          - translate: int64 array with one (start, end) row per TREES
+            block for its TRANSLATE command, (-1, -1) if it has none
+          - stamp: (size, modification time) of the tree file when indexed
+    """
+
+    def __init__(self, filename, offsets, blocks=None, translate=None,
+                 stamp=None):
+        self.filename = filename
+        self.offsets = offsets
+        if blocks is None:
+            blocks = numpy.empty(len(offsets), numpy.int32)
+            blocks.fill(-1)
+        self.blocks = blocks
+        if translate is None:
+            translate = numpy.empty((0, 2), numpy.int64)
+        self.translate = translate
+        if stamp is None:
+            stamp = _file_stamp(filename)
+        self.stamp = stamp
+        self._tables = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def description(self, k):
+        """Returns the newick description of tree k as a string"""
+        start, stop = self.offsets[k]
+        f = open(self.filename, "rb")
+        try:
+            f.seek(start)
+            return f.read(stop - start)
+        finally:
+            f.close()
+
+    def tree(self, k, node_class=PhyloTree):
+        """Returns tree k (negative k counts from the end)"""
+        return self._make_tree(self.description(k), node_class,
+                               self.blocks[k])
+
+    def trees(self, start=0, stop=None, step=1, node_class=PhyloTree):
+        """Generator of the trees in range(start, stop, step), reading only
+        those trees. Use start to drop burn-in and step to thin."""
+        start, stop, step = slice(start, stop, step).indices(len(self))
+        f = open(self.filename, "rb")
+        try:
+            for k in xrange(start, stop, step):
+                a, b = self.offsets[k]
+                f.seek(a)
+                yield self._make_tree(f.read(b - a), node_class,
+                                      self.blocks[k])
+        finally:
+            f.close()  # also when the generator is abandoned
+
+    def is_current(self):
+        """True if the tree file has not changed since it was indexed"""
+        return tuple(self.stamp) == _file_stamp(self.filename)
+
+    def save(self, index_filename=None):
+        """Writes the index to index_filename, by default the tree file name
+        plus INDEX_SUFFIX"""
+        if index_filename is None:
+            index_filename = self.filename + INDEX_SUFFIX
+        f = open(index_filename, "wb")
+        try:
+            numpy.savez(f, offsets=self.offsets, blocks=self.blocks,
+                        translate=self.translate,
+                        stamp=numpy.array(self.stamp, numpy.int64))
+        finally:
+            f.close()
+
+    def translate_table(self, block=0):
+        """Returns dictionary of the TRANSLATE table of NEXUS TREES block
+        number block, empty if there is none"""
+        table = self._tables.get(block)
+        if table is None:
+            table = self._tables[block] = {}
+            if 0 <= block < len(self.translate):
+                start, stop = self.translate[block]
+            else:
+                start = stop = -1
+            if start >= 0:
+                f = open(self.filename, "rb")
+                f.seek(start)
+                src = f.read(stop - start)
+                f.close()
+                table.update(nexus_reader.translate_entries(src))
+        return table
+
+    def _make_tree(self, description, node_class, block):
+        return newick.create_tree(description, node_class,
+                                  translate=self.translate_table(block))
+
+
+def build_index(filename):
+    """Scans tree file filename, newick or NEXUS, and returns its
+    TreeIndex. Only the TREES blocks of a NEXUS file are indexed."""
+    f = open(filename, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return TreeIndex(filename, numpy.empty((0, 2), numpy.int64))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = newick._nexus_start(buf[:256])
+            if start is not None:
+                offsets, blocks, translate = _scan_nexus(buf, start)
+            else:
+                offsets, blocks, translate = _scan_newick(buf), None, None
+        finally:
+            buf.close()
+    finally:
+        f.close()
+    offsets = numpy.array(offsets, numpy.int64).reshape((-1, 2))
+    if blocks is not None:
+        blocks = numpy.array(blocks, numpy.int32)
+        translate = numpy.array(translate, numpy.int64).reshape((-1, 2))
+    return TreeIndex(filename, offsets, blocks, translate)
+
+def load_index(filename, save=True):
+    """Returns the TreeIndex of tree file filename, read from its saved
+    index if that is current. Otherwise the file is indexed and, if save
+    is True, the index is saved for next time."""
+    index_filename = filename + INDEX_SUFFIX
+    if os.path.exists(index_filename):
+        data = numpy.load(index_filename)
+        if "blocks" in data.files:  # else an old index, build it again
+            index = TreeIndex(filename, data["offsets"], data["blocks"],
+                              data["translate"], tuple(data["stamp"]))
+            if index.is_current():
+                return index
+    index = build_index(filename)
+    if save:
+        try:
+            index.save(index_filename)
+        except IOError:
+            pass  # read-only location, index again next time
+    return index
+
+
+# ------- Private functions ------------ #
+def _file_stamp(filename):
+    st = os.stat(filename)
+    return (st.st_size, int(st.st_mtime))
+
+def _scan_newick(buf):
+    """List of (start, end) for the non-blank pieces of buf separated by
+    semicolons"""
+    offsets = []
+    start = 0
+    n = len(buf)
+    while start < n:
+        end = buf.find(";", start)
+        if end < 0:
+            end = n
+        if _nonblank_re.search(buf, start, end):
+            offsets.append((start, end))
+        start = end + 1
+    return offsets
+
+def _comment_end(buf, pos):
+    """Offset just past the end of the (nested) comment opened before pos"""
+    depth = 1
+    while depth:
+        m = _comment_re.search(buf, pos)
+        if m is None:
+            return len(buf)
+        if m.group() == "[":
+            depth += 1
+        else:
+            depth -= 1
+        pos = m.end()
+    return pos
+
+def _next_word(buf, pos):
+    """Returns (word, offset past it) for the first word at or after pos,
+    skipping white space and comments, or (None, pos)"""
+    while 1:
+        m = _word_re.match(buf, pos)
+        if m is None:
+            return None, pos
+        if m.group(1):
+            pos = _comment_end(buf, m.end())
+        else:
+            return m.group(2).upper(), m.end()
+
+def _command_end(buf, pos):
+    """Offset of the semicolon ending the NEXUS command at pos, skipping
+    quoted strings and comments"""
+    while 1:
+        m = _special_re.search(buf, pos)
+        if m is None:
+            return len(buf)
+        c = m.group()
+        if c == ";":
+            return m.start()
+        if c == "'":
+            q = _quoted_re.match(buf, m.start())
+            if q is None:
+                return len(buf)
+            pos = q.end()
+        else:
+            pos = _comment_end(buf, m.end())
+
+def _scan_nexus(buf, pos):
+    """Returns (list of (start, end) of tree descriptions, list of the
+    TREES block number of each tree, list of (start, end) of the TRANSLATE
+    command of each TREES block) for NEXUS file buf, scanning from pos, just
+    past #NEXUS"""
+    offsets = []
+    blocks = []
+    translate = []
+    in_trees = False
+    while 1:
+        word, pos = _next_word(buf, pos)
+        if word is None:
+            if _nonblank_re.search(buf, pos) is None:
+                break  # end of file
+            pos = _command_end(buf, pos) + 1  # eg empty command
+            continue
+        end = _command_end(buf, pos)
+        if word == "BEGIN":
+            in_trees = _next_word(buf, pos)[0] == "TREES"
+            if in_trees:
+                translate.append((-1, -1))
+        elif word in ("END", "ENDBLOCK"):
+            in_trees = False
+        elif in_trees and word == "TRANSLATE":
+            translate[-1] = (pos - len(word), end)
+        elif in_trees and word == "TREE":
+            name = _tree_name_re.match(buf, pos)
+            if name is not None and name.end() <= end:
+                offsets.append((name.end(), end))
+                blocks.append(len(translate) - 1)
+        pos = end + 1
+    return offsets, blocks, translate
+
+
+# Main Test function
+if __name__ == '__main__':
+    import sys
+    from optparse import OptionParser
+
+    parser = OptionParser(usage=__usage__, version ="%prog " + __version__)
+    parser.add_option("-b", "--burnin", action="store", dest="burnin", type="int", default=0,
+                      help="Number of trees to skip at start of file, default=%default")
+    parser.add_option("-n", "--thin", action="store", dest="thin", type="int", default=1,
+                      help="Print every n-th tree after the burn-in, default=%default")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("A tree file is required")
+
+    index = load_index(args[0])
+    newick.write_trees(index.trees(options.burnin, None, options.thin), sys.stdout)
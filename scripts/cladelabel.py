@@ -79,6 +79,7 @@ def label_clade(tree, taxa, clade_name):
     clade = reduce(lambda a,b : mrca(a,b),leaves)
     if clade :
         clade.label = clade_name
+        tree.invalidate()  # label index
 
 def main():
     '''Command line program.  This program reads a nexus file or newick tree file'''
@@ -92,6 +93,8 @@ def main():
     
     parser.add_option("-n", "--nexus", action="store_true", dest="nexus", 
                       default = 0 , help="Read trees from NEXUS file rather than newick tree file")
+    parser.add_option("--precision", action="store", dest="precision",  type="int", default = 6,
+                      help="Significant digits of output branch lengths, default=%default")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
 					  help="Print INFO messages to stdout, default=%default")    
 
@@ -100,38 +103,36 @@ def main():
         cactus_logger.setLevel(logging.INFO)
    
     # Get clade labels
-    clade_lines = open(args[0]).read().split('\n\n')
+    clades = []
+    for line in open(args[0]).read().split('\n\n'):
+        name, taxa = line.split(":")
+        clades.append((name.strip(), taxa.split()))
 
     # Get trees
     if len(args) == 2 :
         try :
-            src = open(args[1]).read()
+            infile = newick.open_file(args[1])
         except:
             print 'Error in tree file, %s' % args[0]
             sys.exit()
     else :
-        src = sys.stdin.read()
+        infile = sys.stdin
 
     if options.nexus:
         nxdoc = NexusDoc(log = None)
-        nxdoc.load(src)
+        nxdoc.load(infile.read())
         trees = nxdoc.Trees()
     else :
-        trees = newick.read_trees(src)
+        trees = newick.iter_trees(infile)
                       
-    for line in clade_lines:
-        name, taxa = line.split(":")
-        name = name.strip()
-        taxa = taxa.split()
-
-        for tree in trees:
+    for tree in trees:
+        for name, taxa in clades:
             label_clade(tree, taxa, name)
+        if not options.nexus:
+            newick.write_trees([tree], sys.stdout, True, options.precision)
 
     if options.nexus:
         print nxdoc
-    else :
-        for tree in trees:
-            print "%s;" % tree.write(bl=True)
 
     return 0
 
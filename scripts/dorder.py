@@ -36,7 +36,7 @@ __author__  =    '''Dylan Schwilk'''
 __program__ =    '''dorder'''
 
 from dwstree.icontrasts import  compute_contrasts, prune_missing_vals
-from dwstree.tree_math import weighted_average,  sample_rep
+from dwstree.tree_math import weighted_average,  sample_rep, average
 import logging
 phylo_logger = logging.getLogger('phylo_logger')
 
@@ -76,7 +76,7 @@ def div_age_test(tree, matrix, char1, char2, \
 
     c1 = map(abs, compute_contrasts(tree, matrix, char1, s_contrasts,char1))
     c2 = map(abs, compute_contrasts(tree, matrix, char2, s_contrasts,char1))
-    ages = tree.node_ages()
+    ages = contrast_ages(tree)
     m1 = weighted_average(ages, c1)
     m2 = weighted_average(ages,c2)
 
@@ -109,7 +109,7 @@ def div_age_test(tree, matrix, char1, char2, \
 def divergence_ages(tree, matrix, char1, char2, s_contrasts=False):
     c1 = map(abs,compute_contrasts(tree, matrix, char1, s_contrasts,char1))
     c2 = map(abs,compute_contrasts(tree, matrix, char2, s_contrasts,char1))
-    a = tree.node_ages()
+    a = contrast_ages(tree)
     #assert len(a) == len(c1)
     return zip(c1,c2,a)
     #for i in range(len(a)):
@@ -118,6 +118,13 @@ def divergence_ages(tree, matrix, char1, char2, s_contrasts=False):
 
 # functions for above tests
 
+def contrast_ages(tree):
+    """Returns ages of internal nodes in postorder order, the order of
+    contrasts returned by compute_contrasts. Uses maximum age if tips are
+    non-contemporaneous."""
+    nodes, ages = tree.tip_distances()[:2]
+    return [a for node, a in zip(nodes, ages.tolist()) if not node.is_tip()]
+
 def SvS(c1, c2):
     """return SvS statistic.
     Algorithm according to description by David Ackerly.
@@ -149,6 +156,7 @@ def main():
     '''Command line program to read trees and character values from a NEXUS
     file and produce test results.'''
     from nexus_doc import NexusDoc
+    from dwstree import newick
     from optparse import OptionParser
     import sys    
 
@@ -172,7 +180,7 @@ def main():
     (options, args) = parser.parse_args()
     if len(args) == 4 :
         try :
-            src = open(args[3]).read()
+            src = newick.open_file(args[3]).read()
         except IOError:
             phylo_logger.error('Error in file, %s' % args[0])
             sys.exit()
@@ -21,9 +21,11 @@ def isfamily(s):
 
 for c in tree:
     if c.label and isorder(c.label): c.children = []
+tree.invalidate()  # children lists changed directly
 
 for c in tree:
     if c.label and isfamily(c.label): c.children = []
+tree.invalidate()
     
 
-print tree, ";"
+newick.write_trees([tree], sys.stdout)
@@ -58,25 +58,37 @@ phylo_logger = logging.getLogger('phylo_logger')
 
 def phylomatic(mtree,taxa, normalize=False, prune=True):
     '''Run phylomatic replacement algorithm on megatree (mtree) using taxa
-    list.'''
+    list. A taxon is attached to the first node in postorder with a
+    matching label.'''
     newtree = mtree.copy()
+    # label -> node for labels found once; duplicated labels are looked up
+    # by a postorder search of the current tree
+    index = {}
+    dups = set()
+    for node in newtree.postorder():
+        if node.label in index : dups.add(node.label)
+        else : index[node.label] = node
     for taxon in taxa:
         matched = False
         for i, lab in enumerate(taxon):  # each taxon list must already be in order species, genus, family, etc
-            for node in newtree.postorder():
-                if node.label == lab :
-                    matched = True
-                    phylo_logger.info("FOUND MATCH: " + node.label)
-                    toadd = taxon[0:i]
-                    toadd.reverse()
-                    n = node
-                    for t in toadd:
-                        c =  PhyloTree(label=t)
-                        n.add_child(c)
-                        #print "ADDED ", c.label, " TO ", n.label
-                        n = c
-                    break
-            if matched : break
+            if lab in dups :
+                node = _first_match(newtree, lab)
+            else :
+                node = index.get(lab)
+            if node is not None :
+                matched = True
+                phylo_logger.info("FOUND MATCH: " + node.label)
+                toadd = taxon[0:i]
+                toadd.reverse()
+                n = node
+                for t in toadd:
+                    c =  PhyloTree(label=t)
+                    n.add_child(c)
+                    if t in index : dups.add(t)
+                    else : index[t] = c
+                    #print "ADDED ", c.label, " TO ", n.label
+                    n = c
+                break
         if not matched : phylo_logger.warning("NO MATCH: " + "/".join(taxon))
 
     if prune :
@@ -87,6 +99,11 @@ def phylomatic(mtree,taxa, normalize=False, prune=True):
 
     return newtree
 
+def _first_match(tree, lab):
+    for node in tree.postorder():
+        if node.label == lab : return node
+    return None
+
 def read_taxa_file(f):
     """Read taxa file in phylomatic format. Returns list of lists of form:
            [ [species, genus, family], [species2,genus2, family2] ]"""
@@ -115,6 +132,8 @@ def main():
 					  help="Normalize resulting tree (collapse nodes with single child), default=%default")
     parser.add_option("-f", "--full", action="store_false", dest="prune", default=True,
 					  help="Output full mega tree (do not prune to taxa list)")
+    parser.add_option("--precision", action="store", dest="precision",  type="int", default = 6,
+					  help="Significant digits of output branch lengths, default=%default")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
 					  help="Print INFO messages to stdout, default=%default")    
 
@@ -125,14 +144,14 @@ def main():
     
     if len(args) == 1 :
         try :
-            src = open(args[0]).read()
+            infile = newick.open_file(args[0])
         except IOError:
             phylo_logger.error('Error reading file, %s' % args[0])
             sys.exit()
     else :
-        src = sys.stdin.read()
+        infile = sys.stdin
 
-    trees = newick.read_trees(src)
+    trees = newick.iter_trees(infile)
 
     # now get taxa
     if options.taxa_file:
@@ -142,13 +161,9 @@ def main():
 
     #for n   in trees[0].postorder(): print n.ulabel()
 
-    result = []
     for tree in trees:
-        result.append(phylomatic(tree,taxa,options.normalize,options.prune))
-
-    for tree in result:
-        #pass
-        print "%s;" % tree
+        tree = phylomatic(tree,taxa,options.normalize,options.prune)
+        newick.write_trees([tree], sys.stdout, True, options.precision)
         #tree.normalize()
         #print tree.children[0].label
        #     if len(node.children)<2 : print node.label
@@ -33,8 +33,8 @@ __author__  =    '''Dylan Schwilk'''
 __usage__   =    '''treeutils.py [options] [tree_file]'''
 
 
-from dwstree import newick
-from dwstree.phylotree import PhyloTree
+from dwstree import newick, array_tree
+from dwstree.phylotree import PhyloTree, condense_trees
 import logging
 logging.basicConfig(format='\n%(levelname)s:\n%(message)s\n')
 phylo_logger = logging.getLogger('phylo_logger')
@@ -65,6 +65,12 @@ def main():
 					  help="Prune to taxa in file")
     parser.add_option("-r", "--reroot", action="store", dest="reroot", default='',
 					  help="Reroot tree at node with label")
+    parser.add_option("-c", "--condense", action="store_true", dest="condense", default=False,
+					  help="Remove duplicate trees (same topology and tip labels), default=%default")
+    parser.add_option("--precision", action="store", dest="precision",  type="int", default = 6,
+					  help="Significant digits of output branch lengths, default=%default")
+    parser.add_option("-b", "--binary", action="store", dest="binary", default='',
+					  help="Write trees to binary tree file rather than newick to stdout")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False,
 					  help="Print INFO messages to stdout, default=%default")    
 
@@ -75,49 +81,62 @@ def main():
     
     if len(args) == 1 :
         try :
-            src = open(args[0]).read()
+            trees = newick.read_tree_file(args[0])  # newick or binary
         except IOError:
             phylo_logger.error('Error reading tree file, %s' % args[0])
             sys.exit()
     else :
-        src = sys.stdin.read()
+        trees = newick.iter_trees(sys.stdin)
 
-    trees = newick.read_trees(src)
+    if options.binary:
+        outfile = open(options.binary, "wb")
+        def write(trees):
+            for tree in trees:
+                array_tree.write_binary(array_tree.from_phylotree(tree), outfile)
+    else :
+        def write(trees):
+            newick.write_trees(trees, sys.stdout, True, options.precision)
 
     # now get taxa
     if options.taxa_file:
         taxa = read_taxa(open(options.taxa_file))
+    if options.prune:
+        try :
+            ptaxa = read_taxa(open(options.prune).readlines())
+        except IOError:
+            phylo_logger.error('Error reading file, %s' % options.prune)
+            sys.exit()
+        ptaxa = [i[0] for i in ptaxa]
  
     result = []
     for tree in trees:
         if options.prune:
-            try :
-                ptaxa = read_taxa(open(options.prune).readlines())
-            except IOError:
-                phylo_logger.error('Error reading file, %s' % options.prune)
-                sys.exit()
-            
-            ptaxa = [i[0] for i in ptaxa]
             tree.prune_to_taxa(ptaxa)
             
         if options.reroot:
-            for node in tree:
-                if node.label and node.label==options.reroot:
-                    tree = node
-                    tree.bl=0.0
-                    tree.parent = None
-                    break
+            node = tree.node_by_label(options.reroot)
+            if node is not None:
+                tree = node
+                tree.bl=0.0
+                tree.parent = None
  
 
         if options.normalize:
             tree.normalize()
-        result.append(tree)
+        if options.condense:
+            result.append(tree)  # need all trees
+        else :
+            write([tree])
         
         #result.append(phylomatic(tree,taxa,options.normalize,options.prune))
 
+    if options.condense:
+        result = [t for t, n in condense_trees(result)]
+
     ## Print results
-    for tree in result:
-        print "%s;" % tree
+    write(result)
+    if options.binary:
+        outfile.close()
     return 0
 
 
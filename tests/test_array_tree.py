@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dwstree import array_tree, newick
+
+
+class FromNewickTest(unittest.TestCase):
+
+    def check(self, src):
+        self.assertEqual(array_tree.from_newick(src).to_phylotree().write(True),
+                         newick.create_tree(src).write(True))
+
+    def test_quote_in_comment(self):
+        self.check("(a[it's a note],b);")
+        self.check("[it's] ((a:1,b:2)x:1,c:3);")
+
+    def test_bracket_in_quoted_label(self):
+        self.check("('a[1]':1,'b''s':2)[c]x:3;")
+
+    def test_unterminated(self):
+        self.assertRaises(StandardError, array_tree.from_newick, "(a,'b);")
+        self.assertRaises(StandardError, array_tree.from_newick, "(a[x,b);")
+
+
+class BinaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_unicode_labels(self):
+        t = newick.create_tree(u"(\xe9t\xe9:1,b:2)x;")
+        f = os.path.join(self.dir, "u.dwst")
+        array_tree.save([array_tree.from_phylotree(t)], f)
+        r = array_tree.load(f)[0]
+        self.assertEqual(r.labels, ["x", u"\xe9t\xe9", "b"])
+        self.assertTrue(type(r.labels[0]) is str)
+        self.assertEqual(r.to_phylotree().write(True), t.write(True))
+
+    def test_round_trip(self):
+        trees = newick.read_trees("((a:1,'b c':2)x:1,c:3);(d:1,(e,f):2);")
+        f = os.path.join(self.dir, "t.dwst")
+        array_tree.save([array_tree.from_phylotree(t) for t in trees], f)
+        self.assertTrue(array_tree.is_binary_file(f))
+        for mmap in (True, False):
+            loaded = array_tree.load(f, mmap)
+            self.assertEqual([a.to_phylotree().write(True) for a in loaded],
+                             [t.write(True) for t in trees])
+        self.assertEqual(loaded[0].labels, ["x", "c", "a", "b c"])
+        self.assertEqual([t.write(True) for t in newick.read_tree_file(f)],
+                         [t.write(True) for t in trees])
+
+    def test_mmap_views(self):
+        t = newick.create_tree("((a:1,b:2):1,c:3);")
+        f = os.path.join(self.dir, "t.dwst")
+        array_tree.save([array_tree.from_phylotree(t)], f)
+        a = array_tree.load(f)[0]
+        self.assertFalse(a.bl.flags.writeable)  # read-only view of the map
+        self.assertTrue(array_tree.load(f, False)[0].bl.flags.writeable)
+
+    def test_empty_file(self):
+        f = os.path.join(self.dir, "empty.dwst")
+        array_tree.save([], f)
+        self.assertEqual(array_tree.load(f), [])
+        self.assertEqual(array_tree.load_replicates(f), [])
+        self.assertEqual(list(newick.read_tree_file(f)), [])
+
+
+class ReplicateTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.a = newick.create_tree("((a:1,b:1):1,(c:1,d:1):1);")
+        self.b = newick.create_tree("((a:2,b:2):1,(c:1,d:3):1);")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        reps = array_tree.ReplicateTrees(array_tree.from_phylotree(self.a))
+        reps.add(self.b)
+        f = os.path.join(self.dir, "r.dwst")
+        array_tree.save([reps], f)
+        loaded = array_tree.load_replicates(f)[0]
+        self.assertEqual(loaded.bl_matrix().shape, (2, 7))
+        self.assertEqual([t.write(True) for t in loaded.trees()],
+                         [self.a.write(True), self.b.write(True)])
+        trees = array_tree.load(f)
+        self.assertTrue(trees[0].parent is trees[1].parent)  # shared topology
+
+    def test_topology_mismatch(self):
+        reps = array_tree.ReplicateTrees(array_tree.from_phylotree(self.a))
+        other = newick.create_tree("(((a:1,b:1):1,c:1):1,d:1);")  # 7 nodes too
+        self.assertRaises(ValueError, reps.add, other)
+        self.assertRaises(ValueError, reps.add, newick.create_tree("(a,b);"))
+        self.assertEqual(len(reps), 1)
+
+    def test_no_replicates(self):
+        from dwstree import rarefaction
+        f = os.path.join(self.dir, "sim.dwst")
+        rarefaction.write_simulated([], "BLADJ_UNIFORM", f)
+        self.assertEqual(array_tree.load(f), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
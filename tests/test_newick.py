@@ -0,0 +1,61 @@
+import unittest
+
+from dwstree import newick
+from dwstree.phylotree import TaxonNamespace
+
+
+def same(src, tokens, **kw):
+    """newick string src read by the scanner and the cleaned up token list
+    tokens read by the token-list path write identically"""
+    a = newick.create_tree(src, **kw).write(True)
+    b = newick.create_tree(tokens, **kw).write(True)
+    return a == b and a
+
+
+class CreateTreeTest(unittest.TestCase):
+
+    def test_quoted_labels(self):
+        self.assertEqual(same("('a b':1,'it''s':2,'x,y':3)'q(r)';",
+                              ['(', 'a b', ':', '1', ',', "it's", ':', '2', ',',
+                               'x,y', ':', '3', ')', 'q(r)']),
+                         "('a b':1,'it''s':2,'x,y':3)'q(r)':0")
+
+    def test_comments(self):
+        self.assertEqual(same("[&R] (a[note]:1,b[&&NHX:x=1]:2)[it's];",
+                              ['(', 'a', ':', '1', ',', 'b', ':', '2', ')']),
+                         "(a:1,b:2):0")
+
+    def test_branch_lengths(self):
+        self.assertEqual(same("(a:-2.5e-3,b:1E2)x:.5;",
+                              ['(', 'a', ':', '-2.5e-3', ',', 'b', ':', '1E2',
+                               ')', 'x', ':', '.5']),
+                         "(a:-0.0025,b:100)x:0.5")
+
+    def test_translate(self):
+        table = {'1': 'alpha', '2': 'beta', '3': 'gamma'}
+        self.assertEqual(same("((1:1,2:1)3:1,4:2);",
+                              ['(', '(', '1', ':', '1', ',', '2', ':', '1', ')',
+                               '3', ':', '1', ',', '4', ':', '2', ')'],
+                              translate=table),
+                         "((alpha:1,beta:1)3:1,4:2):0")  # not internal labels
+
+    def test_namespace(self):
+        ns = TaxonNamespace()
+        a = newick.create_tree("(ab,c);", namespace=ns)
+        b = newick.create_tree(["(", "".join(["a", "b"]), ",", "c", ")"],
+                               namespace=ns)  # a different 'ab' string
+        self.assertTrue(a.leaves()[0].label is b.leaves()[0].label)
+        self.assertEqual(ns.labels, ["ab", "c"])
+        self.assertTrue("c" in ns)
+
+    def test_unicode(self):
+        self.assertEqual(newick.create_tree(u"(a:1,b:2);").write(True),
+                         "(a:1,b:2):0")
+
+    def test_errors(self):
+        self.assertRaises(StandardError, newick.create_tree, "((a,b);")
+        self.assertRaises(StandardError, newick.create_tree, "(a,b));")
+
+
+if __name__ == '__main__':
+    unittest.main()
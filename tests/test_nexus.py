@@ -0,0 +1,113 @@
+import unittest
+from StringIO import StringIO
+
+from dwstree import newick, nexus_blocks, nexus_doc, nexus_parser, nexus_reader
+
+TRANSLATE = ("#NEXUS\nbegin trees;\n  translate 1 A-one, 2 'b c', 3 d;\n"
+             "  tree t = ((1,2),3);\nend;\n")
+
+
+def parser(log):
+    p = nexus_parser.NexusParser(log)
+    p.addRecognize('CONTINUOUS', nexus_blocks.ContinuousBlock)
+    p.addRecognize('TREES', nexus_blocks.TreesBlock)
+    return p
+
+
+class NexusParserTest(unittest.TestCase):
+
+    def test_unicode_source(self):
+        p = parser(StringIO())
+        p.parse(u"#NEXUS\nbegin trees; tree a = (b,c); end;\n")
+        self.assertEqual(p.blocks['TREES'].descriptions.keys(), ['a'])
+
+    def test_incorrect_block(self):
+        log = StringIO()
+        p = parser(log)
+        p.parse("#NEXUS\nbegin continuous; dimensions nchar=x; matrix t 1;"
+                " end;\nbegin trees; tree a = (b,c); end;\n")
+        self.assertTrue("Line 2 - ERROR: Empty or incorrect block 'CONTINUOUS'"
+                        " - ValueError: invalid literal" in log.getvalue())
+        self.assertEqual(p.blocks['TREES'].descriptions.keys(), ['a'])
+
+
+class TranslateTest(unittest.TestCase):
+
+    def test_entries(self):
+        self.assertEqual(nexus_reader.translate_entries(
+                "translate 1 A-one, 2 'b c', 3 [x] d.e,"),
+                         [('1', 'A-one'), ('2', 'b c'), ('3', 'd.e')])
+        self.assertRaises(ValueError, nexus_reader.translate_entries,
+                          "translate 1 a, 2, 3 c")
+        self.assertRaises(ValueError, nexus_reader.translate_entries,
+                          "translate 1 a 2 b")  # missing comma
+
+    def test_iter_trees(self):
+        trees = list(nexus_reader.iter_trees(StringIO(TRANSLATE)))
+        self.assertEqual(trees[0][1].write(), "((A-one,'b c'),d)")
+
+    def test_trees_block(self):
+        p = parser(StringIO())
+        p.parse(TRANSLATE)
+        self.assertEqual(p.blocks['TREES'].getTree('t').write(),
+                         "((A-one,'b c'),d)")
+
+
+class LazyTreesTest(unittest.TestCase):
+
+    src = ("#NEXUS\nbegin trees;\n  translate 1 a, 2 b, 3 c;\n"
+           "  tree one = ((1:1,2:1):1,3:2);\n  tree two = (1,(2,3));\nend;\n")
+
+    def doc(self, keep_trees=True):
+        d = nexus_doc.NexusDoc(StringIO(), keep_trees=keep_trees)
+        d.load(self.src)
+        return d
+
+    def test_parsed_on_demand(self):
+        d = self.doc()
+        block = d.blocks['TREES']
+        self.assertEqual(d.TreeNames(), ['one', 'two'])
+        self.assertEqual(block.objects['TREES'].values(), [None, None])
+        t = d.TreeByName('two')
+        self.assertEqual(t.write(), "(a,(b,c))")
+        self.assertTrue(d.TreeByName('two') is t)  # stored once parsed
+        self.assertTrue(block.objects['TREES']['one'] is None)
+        self.assertEqual(d.Tree(1).write(True), "((a:1,b:1):1,c:2):0")
+
+    def test_keep_trees_false(self):
+        d = self.doc(False)
+        t = d.TreeByName('one')
+        self.assertFalse(d.TreeByName('one') is t)
+        self.assertEqual(d.TreeByName('one').write(True), t.write(True))
+        self.assertEqual(d.blocks['TREES'].objects['TREES'].values(),
+                         [None, None])
+
+    def test_release_trees(self):
+        d = self.doc()
+        t = d.TreeByName('one')
+        t.children[0].label = 'changed'
+        d.ReleaseTrees(['one'])
+        self.assertTrue(d.blocks['TREES'].objects['TREES']['one'] is None)
+        self.assertEqual(d.TreeByName('one').write(), "((a,b),c)")
+        d.Trees()
+        d.ReleaseTrees()
+        self.assertEqual(d.blocks['TREES'].objects['TREES'].values(),
+                         [None, None])
+
+    def test_shared_namespace(self):
+        d = self.doc()
+        a, b = d.Trees()
+        self.assertTrue(a.leaves()[0].label is b.leaves()[0].label)
+        self.assertTrue(a.leaves()[0].label is
+                        d.blocks['TREES'].objects['TRANSLATE']['1'])
+
+    def test_same_as_create_tree(self):
+        d = self.doc()
+        table = dict(d.blocks['TREES'].objects['TRANSLATE'].items())
+        self.assertEqual(d.TreeByName('one').write(True),
+                         newick.create_tree("((1:1,2:1):1,3:2);",
+                                            translate=table).write(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+from dwstree import newick, phylotree
+
+
+def tree(s):
+    return newick.read_trees(s)[0]
+
+
+class SubtreeStatsTest(unittest.TestCase):
+
+    def test_topology_stats(self):
+        t = tree("((a:1,b:2):1,c:5);")
+        s = t.subtree_stats()[t]
+        self.assertEqual((s.nleaves, s.ndescendants, s.height), (3, 4, 2))
+
+    def test_lengths_follow_bl(self):
+        t = tree("((a:1,b:2):1,c:5);")
+        self.assertEqual(t.subtree_lengths()[t], (5.0, 9.0))
+        t.children[1].bl = 1.0  # plain assignment, no invalidate()
+        self.assertEqual(t.subtree_lengths()[t], (3.0, 5.0))
+
+
+class LabelIndexTest(unittest.TestCase):
+
+    def test_first_in_preorder(self):
+        t = tree("((a,b)x,(c,a)x)r;")
+        first = t.node_by_label("x")
+        self.assertTrue(first is t.children[0])
+        self.assertTrue(t.label_index()["a"] is t.children[0].children[0])
+        self.assertEqual(len(t.nodes_by_label("a")), 2)
+        self.assertEqual(t.nodes_by_label("zz"), [])
+        self.assertEqual(t.node_by_label("zz"), None)
+
+    def test_rebuilt_after_change(self):
+        t = tree("((a,b)x,c)r;")
+        t.node_by_label("a")
+        t.node_by_label("x").unlink_child(t.node_by_label("a"))
+        self.assertEqual(t.node_by_label("a"), None)
+        t.node_by_label("c").label = "d"
+        t.invalidate()
+        self.assertEqual(t.node_by_label("c"), None)
+        self.assertEqual(t.node_by_label("d").label, "d")
+
+
+class InducedSubtreeTest(unittest.TestCase):
+
+    def test_same_as_prune(self):
+        src = "(((a:1,b:2)x:1,c:3)y:1,(d:1,e:1)z:2)r;"
+        t = tree(src)
+        sub = t.induced_subtree(["a", "c", "d"])
+        self.assertEqual(sub.write(True), "((a:2,c:3)y:1,d:3)r:0")
+        p = t.copy()
+        p.prune_to_taxa(["a", "c", "d"])
+        p.normalize()
+        self.assertEqual(sorted([n.label for n in p.leaves()]),
+                         sorted([n.label for n in sub.leaves()]))
+        self.assertEqual(t.write(True), tree(src).write(True))  # unchanged
+
+    def test_no_match(self):
+        self.assertEqual(tree("(a,b);").induced_subtree(["q"]), None)
+
+
+class CanonicalFormTest(unittest.TestCase):
+
+    def test_child_order(self):
+        a = tree("((c,d),(a,b),e);")
+        b = tree("(e,(b,a),(d,c));")
+        self.assertEqual(a.canonical_form(), b.canonical_form())
+        self.assertEqual(a.canonical_hash(), b.canonical_hash())
+        self.assertTrue(phylotree.equivalent(a, b))
+
+    def test_unlabeled_tips(self):
+        a = tree("((,b),(c,d));")
+        b = tree("((c,d),(b,));")
+        self.assertEqual(a.canonical_form(), b.canonical_form())
+
+    def test_punctuation_in_labels(self):
+        a = tree("('a,b',c);")
+        b = tree("(a,'b,c');")
+        self.assertNotEqual(a.canonical_form(), b.canonical_form())
+        self.assertEqual(a.canonical_form(), "('a,b',c)")
+
+    def test_branch_lengths(self):
+        a = tree("(a:1,b:2);")
+        b = tree("(b:2,a:1.0000001);")
+        self.assertEqual(a.canonical_form(True), b.canonical_form(True))
+        self.assertNotEqual(a.canonical_form(True, 9), b.canonical_form(True, 9))
+
+    def test_condense_trees(self):
+        trees = [tree(s) for s in ["((a,b),c);", "(c,(b,a));", "((a,c),b);"]]
+        counts = [n for t, n in phylotree.condense_trees(trees)]
+        self.assertEqual(counts, [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+
+from dwstree import newick, splits
+
+
+class SplitsTest(unittest.TestCase):
+
+    def test_single_child_above_tip(self):
+        """A single-child node above a tip adds no one-leaf clade"""
+        a = newick.read_trees("((a)x:1,(b,c):1);")[0]
+        b = newick.read_trees("(a:1,(b,c):1);")[0]
+        index = splits.taxon_index([a, b])
+        self.assertEqual(a.splits(index), {6: 1.0})
+        self.assertEqual(splits.rf_distance(a, b), 0)
+        self.assertEqual(splits.rf_matrix([a, b]).tolist(), [[0, 0], [0, 0]])
+        self.assertEqual(splits.branch_score_matrix([a, b]).tolist(),
+                         [[0.0, 0.0], [0.0, 0.0]])
+
+    def test_include_trivial(self):
+        a = newick.read_trees("((a)x:1,(b,c):1);")[0]
+        self.assertEqual(a.splits(include_trivial=True),
+                         {1: 1.0, 2: 0.0, 4: 0.0, 6: 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dwstree import newick, tree_index
+
+NEXUS = """\xef\xbb\xbf
+#NEXUS
+begin trees;
+  translate 1 a-1, 2 'b c', 3 c;
+  tree one = ((1:1,2:1):1,3:2);
+end;
+begin trees;
+  translate 1 x, 2 y, 3 z;
+  tree two = (1,(2,3));
+  tree three = ((1,3),2);
+end;
+"""
+
+
+class TreeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "t.nex")
+        f = open(self.filename, "wb")
+        f.write(NEXUS)
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_translate_per_block(self):
+        index = tree_index.build_index(self.filename)
+        self.assertEqual(len(index), 3)
+        self.assertEqual([t.write() for t in index.trees()],
+                         ["((a-1,'b c'),c)", "(x,(y,z))", "((x,z),y)"])
+        self.assertEqual(index.tree(0).write(True), "((a-1:1,'b c':1):1,c:2):0")
+        self.assertEqual(index.tree(-1).write(), "((x,z),y)")
+
+    def test_saved_index(self):
+        tree_index.load_index(self.filename)
+        index = tree_index.load_index(self.filename)
+        self.assertEqual(index.blocks.tolist(), [0, 1, 1])
+        self.assertEqual(index.tree(1).write(), "(x,(y,z))")
+
+    def test_newick(self):
+        f = open(self.filename, "wb")
+        f.write("(a,b);\n((c,d),e);\n")
+        f.close()
+        index = tree_index.build_index(self.filename)
+        self.assertEqual([t.write(True) for t in index.trees()],
+                         [t.write(True) for t in
+                          newick.read_tree_file(self.filename)])
+
+
+if __name__ == '__main__':
+    unittest.main()
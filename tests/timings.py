@@ -1,13 +1,32 @@
 
 
 def reroot(tree, lab):
-    for node in tree:
-        if node.label == lab:
-            #print "Found" , lab
-            tree = node
-            tree.parent=None
-            return tree
-    raise lab + " Not found"
+    tree = tree.node_by_label(lab)
+    if tree is None:
+        raise lab + " Not found"
+    tree.parent=None
+    return tree
+
+def memory_per_node(node_class, ntips=100000):
+    """Returns bytes of process memory per node used by a random bifurcating
+    tree of ntips tips built from node_class nodes"""
+    import random, resource
+    random.seed(1)
+    labels = ["t%d" % i for i in range(ntips)]
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    nodes = [node_class(bl=1.0, label=l) for l in labels]
+    parents = []
+    while len(nodes) > 1:
+        random.shuffle(nodes)
+        while len(nodes) > 1:
+            p = node_class(bl=random.random())
+            p.add_child(nodes.pop())
+            p.add_child(nodes.pop())
+            parents.append(p)
+        nodes = nodes + parents
+        parents = []
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) * 1024.0 / (2*ntips - 1)
         
 if __name__=="""__main__""":
 
@@ -17,6 +36,9 @@ if __name__=="""__main__""":
     import newick
     import branch_lengths
 
+    print "PhyloNode bytes/node", memory_per_node(phylotree.PhyloNode)
+    print "PhyloTree bytes/node", memory_per_node(phylotree.PhyloTree)
+
 
 
     tree = newick.read_trees(open("ecol-let-sim/globalphylo").read())[0]
@@ -65,21 +87,10 @@ if __name__=="""__main__""":
     #print tree
     
     t= timeit.Timer("tree.write(True)","from __main__ import tree")
-    t2= timeit.Timer("tree.write2(True)","from __main__ import tree")
-    t3= timeit.Timer("tree.write3(True)","from __main__ import tree")
-    t4= timeit.Timer("tree.write4(True)","from __main__ import tree")
-
-    #print tree.write4(True)
-    
+    t2= timeit.Timer("tree.write(True, out=StringIO())","from __main__ import tree; from cStringIO import StringIO")
 
-#    print "write4",t4.timeit(1000)    
-#    print "write", t.timeit(1000)
-#    print "write3",t3.timeit(1000)
-    
-#    print "write2", min(t2.repeat(10,100))
-#    print "write", min(t.repeat(10,100))    
-#    print "write3", min(t3.repeat(10,100))
-#    print "write4", min(t4.repeat(10,100))
+#    print "write", min(t.repeat(10,100))
+#    print "write to file", min(t2.repeat(10,100))
 
     
     